@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from src import config
+from src.metrics import LatencyHistogram
+
+# Scraper throughput benchmark against src/mock_github.py (no tokens or network needed).
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def mock_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/_mock/stats", timeout=5) as response:
+        return json.load(response)
+
+def start_mock(args, port):
+    """Starts the mock server in its own process so it doesn't share the scraper's event loop."""
+    cmd = [sys.executable, '-m', 'src.mock_github', '--port', str(port),
+           '--latency', str(args.latency), '--rate-limit', str(args.rate_limit),
+           '--window', str(args.window), '--secondary', str(args.secondary)]
+    cmd += ['--fixtures', args.fixtures] if args.fixtures else ['--threads', str(args.threads)]
+    if args.full_objects: cmd.append('--full-objects')
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Mock server exited during startup.")
+        try:
+            return process, base_url, mock_stats(base_url)['repos']
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Mock server didn't start in time.")
+
+def run_once(scraper, repos, output_dir, base_url):
+    """Runs one full scrape of `repos`. Returns its measurements."""
+    scraper.request_latency = LatencyHistogram()
+    scraper.token_manager.stalls = {'count': 0, 'seconds': 0.0}
+    scraper.token_manager.pacing = {'count': 0, 'seconds': 0.0}
+    scraper.token_manager.waiting = None
+    scraper.decode_stats.update(bytes=0, seconds=0.0)
+    before = mock_stats(base_url)
+
+    targets = []
+    for full_name in repos:
+        owner, repo = full_name.split('/')
+        targets.append(scraper.RepoTarget(owner, repo, os.path.join(output_dir, f"{owner}-{repo}")))
+
+    start = time.perf_counter()
+    asyncio.run(scraper.main(targets))
+    elapsed = time.perf_counter() - start
+
+    after = mock_stats(base_url)
+    requests = scraper.request_latency.total
+    threads = sum(t.total_threads for t in targets)
+    return {
+        'seconds': round(elapsed, 3),
+        'requests': requests,
+        'threads': threads,
+        'rows': sum(t.writer.rows_written for t in targets if t.writer),
+        'requests_per_sec': round(requests / elapsed, 1),
+        'threads_per_sec': round(threads / elapsed, 1),
+        'p50_latency': round(scraper.request_latency.percentile(50), 4),
+        'p99_latency': round(scraper.request_latency.percentile(99), 4),
+        'decoded_mb': round(scraper.decode_stats['bytes'] / 1024 / 1024, 1),
+        'decode_seconds': round(scraper.decode_stats['seconds'], 2),
+        'token_stalls': scraper.token_manager.stalls['count'],
+        'token_stall_seconds': round(scraper.token_manager.stalls['seconds'], 2),
+        'pacing_waits': scraper.token_manager.pacing['count'],
+        'pacing_seconds': round(scraper.token_manager.pacing['seconds'], 2),
+        'rate_limited': after['rate_limited'] - before['rate_limited'],
+        'secondary_limited': after['secondary_limited'] - before['secondary_limited'],
+        'not_modified': after['not_modified'] - before['not_modified'],
+        'peak_in_flight': after['peak_in_flight'],
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+def print_report(results):
+    print("\n" + "="*40)
+    print("BENCHMARK RESULTS")
+    print("="*40)
+    keys = list(results[0].keys())
+    print(f"{'':<20}" + "".join(f"{f'run {i + 1}':>12}" for i in range(len(results))))
+    for key in keys:
+        print(f"{key:<20}" + "".join(f"{r[key]:>12}" for r in results))
+
+def main():
+    parser = argparse.ArgumentParser(description="Scraper throughput benchmark on an offline GitHub mock")
+    parser.add_argument('--fixtures', type=str, help="Scrape _FINAL.csv or fixtures JSON to replay (default: synthetic)")
+    parser.add_argument('--threads', type=int, default=500, help="Synthetic threads to generate")
+    parser.add_argument('--tokens', type=int, default=1, help="Fake tokens to rotate between")
+    parser.add_argument('--pacing', type=float, help="Override config.TOKEN_REQUESTS_PER_MINUTE")
+    parser.add_argument('--latency', type=float, default=0.05, help="Mean mock response latency in seconds")
+    parser.add_argument('--rate-limit', type=int, default=5000, help="Requests per token per window")
+    parser.add_argument('--window', type=int, default=3600, help="Rate-limit window in seconds")
+    parser.add_argument('--secondary', type=float, default=0.0, help="Probability of a secondary rate limit 403")
+    parser.add_argument('--full-objects', action='store_true', help="Mock serves GitHub's full issue/comment objects")
+    parser.add_argument('--runs', type=int, default=1, help="Repeat runs (later runs reuse the caches)")
+    parser.add_argument('--cache', action='store_true', help="Enable the HTTP response cache")
+    parser.add_argument('--json', type=str, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    process, base_url, repos = start_mock(args, free_port())
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            # everything the scraper persists goes to the scratch dir
+            config.GITHUB_API_URL = base_url
+            config.OUTPUT_DIR = workdir
+            config.HTTP_CACHE_ENABLED = args.cache
+            config.HTTP_CACHE_PATH = os.path.join(workdir, 'cache', 'http_cache.sqlite')
+            config.PROFILE_CACHE_PATH = os.path.join(workdir, 'cache', 'profiles.sqlite')
+            config.INCREMENTAL = False
+            if args.pacing: config.TOKEN_REQUESTS_PER_MINUTE = args.pacing
+
+            os.environ.setdefault('GITHUB_TOKEN', 'benchmark')
+            from src import scraper
+            # never send real tokens from .env to the mock
+            scraper.token_manager.token_data = [scraper.SmartTokenManager._new_token(f"benchmark-{i}") for i in range(args.tokens)]
+
+            results = [run_once(scraper, repos, os.path.join(workdir, f"run{i + 1}"), base_url) for i in range(args.runs)]
+    finally:
+        process.terminate()
+        process.wait()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,117 +1,176 @@
 import pandas as pd
-import random
+import numpy as np
 import os
 import glob
+import itertools
 from faker import Faker
 from src import config
+from src import identities
+from src import storage
+from src.identities import IdentityStore
 
 fake = Faker()
 
-def generate_human_name(row):
-    """Generates realistic names based on username or gender."""
-    username = str(row['email']).split('@')[0]
-    current_name = str(row['name']) if pd.notna(row['name']) else ""
-    gender = row.get('gender')
+def sample_names(elements, draws):
+    """
+    Faker's random_element(elements) for the given uniform draws: an OrderedDict by its weights
+    (the same bisect over the cumulative weights as random.choices), other sequences uniformly.
+    """
+    person = fake.first_name_male.__self__
+    if isinstance(elements, dict) and person.__use_weighting__:
+        choices, weights = list(elements.keys()), elements.values()
+    else:
+        choices, weights = list(elements), [1] * len(elements)
+    cum_weights = np.array(list(itertools.accumulate(weights)))
+    picks = np.searchsorted(cum_weights, draws * cum_weights[-1], side='right')
+    return np.array(choices, dtype=object)[np.minimum(picks, len(cum_weights) - 1)]
+
+def fake_names(genders, first_draws, last_draws):
+    """"first last" names from the Faker locale's lists, like fake.first_name_male() (etc.) + fake.last_name()."""
+    person = fake.first_name_male.__self__
+    first_names = {'MALE': getattr(person, 'first_names_male', person.first_names),
+                   'FEMALE': getattr(person, 'first_names_female', person.first_names)}
+    genders = np.asarray(genders, dtype=object)
+    first = np.empty(len(genders), dtype=object)
+    other = ~np.isin(genders, list(first_names))
+    for rows, elements in [(genders == 'MALE', first_names['MALE']), (genders == 'FEMALE', first_names['FEMALE']),
+                           (other, person.first_names)]:
+        first[rows] = sample_names(elements, first_draws[rows])
+    last = sample_names(person.last_names, last_draws)
+    return [f"{f} {l}" for f, l in zip(first, last)]
+
+def generate_identities(usernames, draws):
+    """(gender, ethnicity, fake name) per username, from its four identities.username_draws."""
+    genders = np.array(identities.GENDERS)[(draws[:, 0] * len(identities.GENDERS)).astype(int)]
+    ethnicities = np.array(identities.ETHNICITIES)[(draws[:, 1] * len(identities.ETHNICITIES)).astype(int)]
+    return list(zip(genders.tolist(), ethnicities.tolist(), fake_names(genders, draws[:, 2], draws[:, 3])))
+
+def email_usernames(emails):
+    return emails.fillna('nan').astype('str').str.split('@', n=1).str[0]
+
+def generate_human_names(df, synthetic_names):
+    """
+    Generates realistic names based on username, for the whole users table.
+    Rows with neither a usable name nor username get their identity's synthetic name.
+    """
+    username = email_usernames(df['email'])
+    current_name = df['name'].fillna('').astype('str')
+    names = pd.Series(pd.NA, index=df.index, dtype='object')
 
     # 1. use existing name if valid
-    if (current_name and
-        current_name.lower() != username.lower() and
-        ' ' in current_name):
-        return current_name
+    valid = (current_name != '') & (current_name.str.lower() != username.str.lower()) & current_name.str.contains(' ', regex=False)
+    names[valid] = current_name[valid]
 
     # 2. derive from username
-    clean_user = username.replace('-', ' ').replace('.', ' ').replace('_', ' ')
-    if ' ' in clean_user and not any(char.isdigit() for char in clean_user):
-        return clean_user.title()
-
-    # 3. generate fake name
-    if gender == 'MALE':
-        return f"{fake.first_name_male()} {fake.last_name()}"
-    elif gender == 'FEMALE':
-        return f"{fake.first_name_female()} {fake.last_name()}"
-    else:
-        return f"{fake.first_name()} {fake.last_name()}"
+    clean_user = username.str.replace('-', ' ', regex=False).str.replace('.', ' ', regex=False).str.replace('_', ' ', regex=False)
+    derived = ~valid & clean_user.str.contains(' ', regex=False) & ~clean_user.str.contains(r'\d', regex=True)
+    names[derived] = clean_user[derived].str.title()
 
-def fix_collaborators(row):
-    """Formats collaborator list into clean emails."""
-    raw_collabs = str(row['collaborators'])
-    if pd.isna(row['collaborators']) or raw_collabs.strip() == '':
-        return ''
+    # 3. synthetic name
+    missing = ~(valid | derived)
+    names[missing] = synthetic_names[missing]
+    return names.astype('str')
 
-    try:
-        domain = str(row['author_email']).split('@')[1]
-    except IndexError:
-        domain = "github.com"
-
-    cleaned_emails = []
-    for u in raw_collabs.split(','):
-        u = u.strip()
-        if not u: continue
-        
-        # filter bots
-        if ('[bot]' in u.lower() or u.lower().endswith('-bot') or 
-            u.lower().startswith('bot-') or u == 'github-actions'):
-            continue
+def fix_collaborators(df):
+    """Formats the collaborator lists of the contexts table into clean emails."""
+    # domain of each context's author
+    domain = df['author_email'].astype('str').str.split('@').str[1].fillna("github.com")
+
+    # one row per collaborator, keeping the context's index
+    users = df['collaborators'].dropna().astype('str').str.split(',').explode().str.strip()
+    lower = users.str.lower()
+
+    # filter bots
+    is_bot = (lower.str.contains('[bot]', regex=False) | lower.str.endswith('-bot') |
+              lower.str.startswith('bot-') | (users == 'github-actions'))
+    users = users[(users != '') & ~is_bot]
+    if users.empty: return pd.Series('', index=df.index)
 
-        cleaned_emails.append(f"{u}@{domain}")
+    emails = users + '@' + domain.loc[users.index].to_numpy()
+    # join back per context (string sum keeps the order within each context)
+    joined = (emails + ',').groupby(level=0).sum().str.slice(0, -1)
+    return joined.reindex(df.index, fill_value='')
 
-    return ",".join(cleaned_emails)
+def csv_path(name):
+    return os.path.join(config.OUTPUT_DIR, f'{name}.csv')
 
-def clean_dataset_group(prefix=""):
-    """Applies cleaning logic to a specific set of CSVs (standard or ltc)."""
+def write_csv(df, name):
+    # via a temp file: the old file may be a hard link shared with the stage cache
+    path = csv_path(name)
+    df.to_csv(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+def clean_dataset_group(prefix, identity_store):
+    """
+    Applies cleaning logic to a specific set of tables (standard or ltc) and writes the final CSVs.
+    Reads the processor's Parquet tables if present, so cleaning can be re-run from the same input.
+    """
     print(f"\n--- Cleaning files with prefix '{prefix}' ---")
     
     # 1. fix contexts
-    ctx_path = os.path.join(config.OUTPUT_DIR, f'{prefix}contexts.csv')
-    if os.path.exists(ctx_path):
-        df = pd.read_csv(ctx_path)
+    ctx_path = storage.find_table(f'{prefix}contexts')
+    if ctx_path:
+        df = storage.read_table(ctx_path)
         df['description'] = df['title']
-        df['collaborators'] = df.apply(fix_collaborators, axis=1)
-        df.to_csv(ctx_path, index=False)
+        df['collaborators'] = fix_collaborators(df)
+        write_csv(df, f'{prefix}contexts')
         print(f"-> {prefix}contexts.csv updated.")
     else:
         print(f"[!] {prefix}contexts.csv not found.")
 
     # 2. fix users
-    user_path = os.path.join(config.OUTPUT_DIR, f'{prefix}users.csv')
-    if os.path.exists(user_path):
-        df = pd.read_csv(user_path)
-        
-        # set demographics
-        genders = ['MALE', 'FEMALE']
-        ethnicities = ['CAUCASIAN', 'ASIAN', 'HISPANIC', 'AFRICAN_AMERICAN']
-        
-        df['gender'] = df['gender'].apply(lambda x: random.choice(genders))
-        df['ethnicity'] = df['ethnicity'].apply(lambda x: random.choice(ethnicities))
+    user_path = storage.find_table(f'{prefix}users')
+    if user_path:
+        df = storage.read_table(user_path)
         
-        # set names
-        df['name'] = df.apply(generate_human_name, axis=1)
+        # set demographics and names from each username's pseudonymous identity
+        found = identity_store.lookup(email_usernames(df['email']).tolist(), generate_identities)
+        synthetic = pd.DataFrame(found, index=df.index, columns=['gender', 'ethnicity', 'name'])
+        df['gender'] = synthetic['gender']
+        df['ethnicity'] = synthetic['ethnicity']
+        df['name'] = generate_human_names(df, synthetic['name'])
         
-        df.to_csv(user_path, index=False)
+        write_csv(df, f'{prefix}users')
         print(f"-> {prefix}users.csv updated.")
     else:
         print(f"[!] {prefix}users.csv not found.")
 
     # 3. fix members
-    mem_path = os.path.join(config.OUTPUT_DIR, f'{prefix}workspace_members.csv')
-    if os.path.exists(mem_path):
-        df = pd.read_csv(mem_path)
+    mem_path = storage.find_table(f'{prefix}workspace_members')
+    if mem_path:
+        df = storage.read_table(mem_path)
         df['role'] = df['role'].fillna('MEMBER')
-        df.to_csv(mem_path, index=False)
+        write_csv(df, f'{prefix}workspace_members')
         print(f"-> {prefix}workspace_members.csv verified.")
     else:
         print(f"[!] {prefix}workspace_members.csv not found.")
 
+    # 4. tables that need no cleaning still need their CSV
+    for name in ['workspaces', 'context_comments']:
+        path = storage.find_table(f'{prefix}{name}')
+        if path and path.endswith('.parquet'):
+            write_csv(storage.read_table(path), f'{prefix}{name}')
+            print(f"-> {prefix}{name}.csv written.")
+
 def main():
     print("Starting post-processing...")
-    
-    # Check for standard files
-    if os.path.exists(os.path.join(config.OUTPUT_DIR, 'users.csv')):
-        clean_dataset_group(prefix="")
-        
-    # Check for LTC files
-    if os.path.exists(os.path.join(config.OUTPUT_DIR, 'ltc_users.csv')):
-        clean_dataset_group(prefix="ltc_")
+
+    # same seed -> same identities, in every prefix, repo and rerun
+    identity_store = IdentityStore()
+    seed = identities.resolve_seed(config.OUTPUT_DIR, identity_store)
+    identity_store.use_seed(seed)
+    identities.record_seed(config.OUTPUT_DIR, seed)
+
+    try:
+        # Check for standard files
+        if storage.find_table('users'):
+            clean_dataset_group("", identity_store)
+
+        # Check for LTC files
+        if storage.find_table('ltc_users'):
+            clean_dataset_group("ltc_", identity_store)
+    finally:
+        identity_store.close()
         
     print("\nPost-processing complete.")
 
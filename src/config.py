@@ -8,8 +8,63 @@ OWNER = 'pandas-dev'
 REPO = 'pandas'
 
 # Scraping Settings
+GITHUB_API_URL = 'https://api.github.com'  # point at src/mock_github.py for offline runs
 MAX_ISSUE_PAGES = 0  # 0 for all
-MAX_CONCURRENT_REQUESTS = 10
+MAX_CONCURRENT_REQUESTS = 20  # HTTP requests in flight across all threads and repos
+MAX_CONCURRENT_THREADS = 10  # threads expanded at once (each may issue many requests)
+TOKEN_REQUESTS_PER_MINUTE = 900  # per-token pacing, below GitHub's secondary rate limit
+TOKEN_BURST = 30  # requests a token may send back-to-back before pacing applies
+TOKEN_RESERVE = 5  # budget kept back per token for requests already in flight
+SHARD_ROWS = 50000  # rows buffered before a shard is flushed to disk
+SCRAPE_BACKEND = 'rest'  # 'rest' or 'graphql'
+GRAPHQL_PAGE_SIZE = 50  # threads per GraphQL query
+BULK_COMMENTS = True  # REST: list all comments once per repo instead of paging each thread's comments_url
+HARVEST_BUFFER_COMMENTS = 200000  # harvested comments held for threads not complete yet, past this some fetch their own
+PUSHDOWN_FILTERS = None  # REST: don't expand threads the 'standard'/'ltc'/'all' pipeline can't keep (--pushdown)
+
+# HTTP Connection
+HTTP_CONNECTION_LIMIT = 100  # open connections across all hosts
+HTTP_CONNECTION_LIMIT_PER_HOST = 30
+HTTP_DNS_CACHE_TTL = 300  # seconds
+HTTP_KEEPALIVE_TIMEOUT = 30  # seconds an idle connection is kept for reuse
+HTTP_CONNECT_TIMEOUT = 10  # seconds
+HTTP_READ_TIMEOUT = 60  # seconds without data before a request is retried
+RETRY_BACKOFF_BASE = 2  # seconds, doubled on every failed attempt (with jitter)
+RETRY_BACKOFF_MAX = 60
+
+# HTTP Cache (ETag revalidation, 304s are free)
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_PATH = os.path.join(BASE_DATA_DIR, 'cache', 'http_cache.sqlite')
+HTTP_CACHE_MAX_MB = 2048
+
+# Profile Store (login -> full name, shared across runs and repos)
+PROFILE_CACHE_PATH = os.path.join(BASE_DATA_DIR, 'cache', 'profiles.sqlite')
+PROFILE_CACHE_TTL_DAYS = 30
+
+# Incremental Scraping
+INCREMENTAL = False  # only refetch threads updated since the last run
+STATE_DIR = os.path.join(BASE_DATA_DIR, 'state')
+INCREMENTAL_SAVE_EVERY = 500  # threads between watermark saves (for crash resume)
+
+# Stage Hand-off
+STAGE_FORMAT = 'parquet'  # intermediate files between stages: 'parquet' (typed, columnar) or 'csv'
+STAGE_COMPRESSION = 'snappy'  # codec for the processor's Parquet tables: 'snappy', 'zstd', 'gzip' or None
+EXPORT_BACKGROUND_WRITES = True  # encode/compress table chunks on a thread while the next is built
+
+# Stage Cache (process/clean results keyed on input hash + config + code)
+STAGE_CACHE_ENABLED = True
+STAGE_CACHE_DIR = os.path.join(BASE_DATA_DIR, 'cache', 'stages')
+
+# Out-of-core Processing (scrapes whose comment bodies don't fit in memory)
+PROCESS_CHUNKED = False  # select on the metadata columns, then stream the text columns in chunks
+PROCESS_CHUNK_ROWS = 20000  # rows per chunk read from the scrape file and written to the tables
+
+# Streaming Processing (pipeline.py --stream)
+STREAM_FLUSH_THREADS = 200  # qualified threads per part of the partial tables written during a scrape
+
+# Pseudonymization (cleaner.py)
+PSEUDONYM_SEED = None  # key for the username hash (or env PSEUDONYM_SEED), None = the identity map's own seed
+IDENTITY_MAP_PATH = os.path.join(BASE_DATA_DIR, 'cache', 'identities.sqlite')
 
 # Filter Settings (processor.py)
 TARGET_EMAIL_DOMAIN = "example.com"
@@ -20,4 +75,7 @@ FILTER_BOT_KEYWORDS = ['[bot]', '-bot', 'bot-']
 
 # Long-Term Contributor Settings
 LTC_MIN_YEARS_ACTIVE = 3
+LTC_WINDOW_MONTHS = 12  # consistency window size (3 = quarterly)
+LTC_MIN_ACTIVE_WINDOWS = None  # windows a user must be active in, None = every window
+LTC_MIN_CASES_PER_WINDOW = 1  # cases needed for a window to count as active
 LTC_MIN_COMMENTS_QUALITY = 2
\ No newline at end of file
@@ -0,0 +1,214 @@
+import asyncio
+from src import config
+from src import scraper
+
+# deleted accounts come back as a null author in GraphQL, REST reports them as this user
+GHOST_USER = {'login': 'ghost', 'id': 10137, 'name': 'Deleted user'}
+
+FRAGMENTS = """
+fragment actorFields on Actor {
+  __typename login
+  ... on User { databaseId name }
+  ... on Organization { databaseId name }
+  ... on Bot { databaseId }
+  ... on Mannequin { databaseId }
+}
+fragment commentFields on IssueCommentConnection {
+  pageInfo { hasNextPage endCursor }
+  nodes { databaseId body createdAt url author { ...actorFields } }
+}
+fragment reviewFields on PullRequestReviewConnection {
+  pageInfo { hasNextPage endCursor }
+  nodes { author { ...actorFields } }
+}
+"""
+
+THREAD_FIELDS = """
+  id databaseId number title body createdAt updatedAt url
+  author { ...actorFields }
+  comments(first: 100) { ...commentFields }
+"""
+
+ISSUES_QUERY = FRAGMENTS + """
+query($owner: String!, $repo: String!, $first: Int!, $cursor: String, $since: DateTime) {
+  repository(owner: $owner, name: $repo) {
+    threads: issues(first: $first, after: $cursor, filterBy: {since: $since},
+                    orderBy: {field: UPDATED_AT, direction: DESC}) {
+      totalCount
+      pageInfo { hasNextPage endCursor }
+      nodes { %s }
+    }
+  }
+}
+""" % THREAD_FIELDS
+
+# pullRequests has no `since` filter, so it's ordered by UPDATED_AT and cut off client-side
+PULLS_QUERY = FRAGMENTS + """
+query($owner: String!, $repo: String!, $first: Int!, $cursor: String) {
+  repository(owner: $owner, name: $repo) {
+    threads: pullRequests(first: $first, after: $cursor, orderBy: {field: UPDATED_AT, direction: DESC}) {
+      totalCount
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        %s
+        commits { totalCount } changedFiles additions deletions
+        reviews(first: 100) { ...reviewFields }
+      }
+    }
+  }
+}
+""" % THREAD_FIELDS
+
+MORE_COMMENTS_QUERY = FRAGMENTS + """
+query($id: ID!, $cursor: String) {
+  node(id: $id) {
+    ... on Issue { comments(first: 100, after: $cursor) { ...commentFields } }
+    ... on PullRequest { comments(first: 100, after: $cursor) { ...commentFields } }
+  }
+}
+"""
+
+MORE_REVIEWS_QUERY = FRAGMENTS + """
+query($id: ID!, $cursor: String) {
+  node(id: $id) {
+    ... on PullRequest { reviews(first: 100, after: $cursor) { ...reviewFields } }
+  }
+}
+"""
+
+async def run_query(session, query, variables, retries=3):
+    """
+    Runs one GraphQL query through the shared fetch_json/token rotation. Returns (`data` or None, errors):
+    with errors, the fields they hit are null in a partial `data`.
+    """
+    for attempt in range(retries):
+        result, _ = await scraper.fetch_json(session, f"{config.GITHUB_API_URL}/graphql", payload={'query': query, 'variables': variables})
+        if not result: return None, []
+
+        errors = result.get('errors') or []
+        if any(e.get('type') == 'RATE_LIMITED' for e in errors):
+            # graphql reports its point budget in the body, not as a 403
+            print(f"\n[!] GraphQL rate limited. Retrying in 60s ({attempt + 1}/{retries})...")
+            await asyncio.sleep(60)
+            continue
+        if errors:
+            print(f"[WARN] GraphQL errors: {errors[0].get('message')}")
+        return result.get('data'), errors
+    return None, errors
+
+def to_rest_user(actor):
+    """Converts a GraphQL Actor into the REST `user` shape (login, id, name)."""
+    if not actor: return dict(GHOST_USER)
+    login = actor['login']
+    # REST logins for GitHub Apps carry the [bot] suffix
+    if actor['__typename'] == 'Bot': login = f"{login}[bot]"
+    return {'login': login, 'id': actor.get('databaseId'), 'name': actor.get('name')}
+
+def to_rest_comment(node):
+    return {
+        'id': node['databaseId'], 'user': to_rest_user(node['author']),
+        'body': node['body'], 'created_at': node['createdAt'], 'html_url': node['url']
+    }
+
+async def fetch_remaining(session, target, query, node_id, key, connection):
+    """
+    Follows a nested connection (comments/reviews) past its first page. Entries a partial error left
+    null are dropped, and a page with errors marks the run incomplete.
+    """
+    nodes = [n for n in connection['nodes'] if n]
+    page_info = connection['pageInfo']
+    while page_info['hasNextPage']:
+        data, errors = await run_query(session, query, {'id': node_id, 'cursor': page_info['endCursor']})
+        if errors or not data or not data.get('node'):
+            target.listing_complete = False
+        if not data or not data.get('node'): break
+        connection = data['node'][key]
+        nodes.extend(n for n in connection['nodes'] if n)
+        page_info = connection['pageInfo']
+    return nodes
+
+async def expand_node(session, target, node, is_pr, thread_limiter):
+    """Builds the same interaction records as process_thread from one GraphQL thread node."""
+    async with thread_limiter:
+        return await _expand_node(session, target, node, is_pr)
+
+async def _expand_node(session, target, node, is_pr):
+    comment_nodes, review_nodes = await asyncio.gather(
+        fetch_remaining(session, target, MORE_COMMENTS_QUERY, node['id'], 'comments', node['comments']),
+        fetch_remaining(session, target, MORE_REVIEWS_QUERY, node['id'], 'reviews', node['reviews']) if is_pr else asyncio.sleep(0, [])
+    )
+
+    author = to_rest_user(node['author'])
+    issue = {
+        'id': node['databaseId'], 'number': node['number'], 'user': author,
+        'title': node['title'], 'body': node['body'] or None,
+        'created_at': node['createdAt'], 'updated_at': node['updatedAt'], 'html_url': node['url']
+    }
+    if is_pr: issue['pull_request'] = {}
+
+    pr_stats = {'commits': None, 'changed_files': None, 'additions': None, 'deletions': None}
+    if is_pr:
+        pr_stats = {'commits': node['commits']['totalCount'], 'changed_files': node['changedFiles'],
+                    'additions': node['additions'], 'deletions': node['deletions']}
+
+    # REST returns reviews by deleted accounts with a null user, which process_thread skips
+    reviews = [{'user': to_rest_user(r['author'])} for r in review_nodes if r['author']]
+    comments_data = [to_rest_comment(c) for c in comment_nodes]
+    comment_names = [c['user']['name'] for c in comments_data]
+
+    # share names with the REST path and later runs
+    for user in [author] + [c['user'] for c in comments_data]:
+        if user['login'] != GHOST_USER['login']: scraper.profile_store.remember(user['login'], user['name'])
+
+    interactions = scraper.build_interactions(target, issue, author['name'], pr_stats, reviews, comments_data, comment_names)
+    return issue, interactions
+
+async def iter_threads(session, target, thread_limiter):
+    """GraphQL fetch backend: yields (issue, interactions) like scraper.iter_rest_threads."""
+    watermark_store = target.watermark_store
+    since = watermark_store.since if watermark_store else None
+
+    for query, is_pr, label in [(ISSUES_QUERY, False, "issues"), (PULLS_QUERY, True, "pull requests")]:
+        variables = {'owner': target.owner, 'repo': target.repo, 'first': config.GRAPHQL_PAGE_SIZE, 'cursor': None}
+        if not is_pr: variables['since'] = since
+
+        page_count = 0
+        next_page = asyncio.ensure_future(run_query(session, query, variables))
+        while next_page:
+            data, errors = await next_page
+            next_page = None
+            if errors:
+                # the threads the errors hit come back as null nodes, so they have to be listed again
+                target.listing_complete = False
+            if not data or not data.get('repository') or not data['repository'].get('threads'):
+                target.listing_complete = False
+                break
+
+            connection = data['repository']['threads']
+            if page_count == 0:
+                print(f"\nGraphQL: {connection['totalCount']} {target.full_name} {label} to scan.")
+            page_count += 1
+
+            nodes = [n for n in connection['nodes'] if n]
+            reached_since = False
+            if since:
+                # sorted by UPDATED_AT desc, so everything after the first stale node is stale too
+                fresh = [n for n in nodes if n['updatedAt'] >= since]
+                reached_since = len(fresh) < len(nodes)
+                nodes = fresh
+            if watermark_store:
+                nodes = [n for n in nodes if not watermark_store.is_current({'number': n['number'], 'updated_at': n['updatedAt']})]
+
+            # prefetch the next listing page while this one is expanded
+            more_pages = config.MAX_ISSUE_PAGES == 0 or page_count < config.MAX_ISSUE_PAGES
+            if connection['pageInfo']['hasNextPage'] and more_pages and not reached_since:
+                variables = dict(variables, cursor=connection['pageInfo']['endCursor'])
+                next_page = asyncio.ensure_future(run_query(session, query, variables))
+
+            target.total_threads += len(nodes)
+            for f in asyncio.as_completed([expand_node(session, target, n, is_pr, thread_limiter) for n in nodes]):
+                try:
+                    yield await f
+                except Exception as e:
+                    print(f"Task failed: {e}")
+                    target.listing_complete = False
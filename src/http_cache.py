@@ -0,0 +1,100 @@
+import json
+import os
+import sqlite3
+import time
+from yarl import URL
+from src import config
+
+class ResponseCache:
+    """
+    Persistent GET response cache keyed by URL. Entries are revalidated with
+    If-None-Match / If-Modified-Since; GitHub doesn't charge rate limit for a 304.
+    Least recently used entries are evicted once the cache exceeds its size limit.
+    """
+    def __init__(self, path=None, max_mb=None):
+        self.path = path or config.HTTP_CACHE_PATH
+        self.max_bytes = (max_mb or config.HTTP_CACHE_MAX_MB) * 1024 * 1024
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,
+                body BLOB, links TEXT, size INTEGER, accessed_at REAL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed_at)")
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+        self.pending_writes = 0
+        self.stats = {'revalidated': 0, 'stored': 0, 'evicted': 0}
+        if self.total_bytes > self.max_bytes: self.evict()
+        print(f"HTTP Cache: {self.total_bytes / 1024 / 1024:.1f} MB at {self.path}")
+
+    def get(self, url):
+        row = self.conn.execute(
+            "SELECT etag, last_modified, body, links FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None: return None
+
+        self.conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        self._maybe_commit()
+        etag, last_modified, body, links = row
+        return {'etag': etag, 'last_modified': last_modified, 'body': body, 'links': links}
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry['etag']: headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']: headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    @staticmethod
+    def cached_links(entry):
+        """Rebuilds the `response.links` shape ({rel: {'url': URL}}) from a cache entry."""
+        return {rel: {'url': URL(u)} for rel, u in json.loads(entry['links']).items()}
+
+    def revalidated(self, entry):
+        """Called on a 304: returns the cached (body, links)."""
+        self.stats['revalidated'] += 1
+        return entry['body'], self.cached_links(entry)
+
+    def put(self, url, headers, body, links):
+        etag, last_modified = headers.get('ETag'), headers.get('Last-Modified')
+        # nothing to revalidate against, so caching it wouldn't save a request
+        if not (etag or last_modified): return
+
+        links_json = json.dumps({rel: str(link['url']) for rel, link in (links or {}).items()})
+        size = len(body) + len(url) + len(links_json)
+
+        old = self.conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (url, etag, last_modified, body, links_json, size, time.time()))
+        self.total_bytes += size - (old[0] if old else 0)
+        self.stats['stored'] += 1
+
+        if self.total_bytes > self.max_bytes: self.evict()
+        self._maybe_commit()
+
+    def evict(self):
+        """Drops least recently used entries until the cache is back under 90% of its limit."""
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT url, size FROM responses ORDER BY accessed_at")
+        to_delete = []
+        for url, size in rows:
+            if self.total_bytes <= target: break
+            to_delete.append((url,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM responses WHERE url = ?", to_delete)
+        self.stats['evicted'] += len(to_delete)
+
+    def _maybe_commit(self):
+        self.pending_writes += 1
+        if self.pending_writes >= 200:
+            self.conn.commit()
+            self.pending_writes = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+        print(f"HTTP Cache: {self.stats['revalidated']} served from cache (304), "
+              f"{self.stats['stored']} stored, {self.stats['evicted']} evicted.")
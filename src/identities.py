@@ -0,0 +1,105 @@
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import numpy as np
+from src import config
+
+GENDERS = ['MALE', 'FEMALE']
+ETHNICITIES = ['CAUCASIAN', 'ASIAN', 'HISPANIC', 'AFRICAN_AMERICAN']
+
+# written to every cleaned folder, so its identities can be regenerated exactly
+SEED_FILE = 'pseudonym_seed.txt'
+
+def username_draws(seed, usernames, count):
+    """
+    `count` uniform [0, 1) numbers per username from HMAC-SHA256(seed, username).
+    Each takes 53 bits of the digest, so up to 4 independent draws per username.
+    """
+    key = seed.encode()
+    draws = np.empty((len(usernames), count))
+    for i, username in enumerate(usernames):
+        digest = hmac.new(key, username.encode(), hashlib.sha256).digest()
+        draws[i] = [int.from_bytes(digest[8 * j:8 * j + 8], 'big') >> 11 for j in range(count)]
+    return draws / 2.0**53
+
+def resolve_seed(run_dir, store):
+    """The run seed: config/env PSEUDONYM_SEED, else the one recorded in run_dir, else the store's default."""
+    seed = config.PSEUDONYM_SEED or os.getenv('PSEUDONYM_SEED')
+    seed_path = os.path.join(run_dir, SEED_FILE)
+    if not seed and os.path.exists(seed_path):
+        with open(seed_path, 'r', encoding='utf-8') as f:
+            seed = f.read().strip()
+    return seed or store.default_seed()
+
+def record_seed(run_dir, seed):
+    # replaced rather than rewritten: the file may be a hard link into the stage cache
+    path = os.path.join(run_dir, SEED_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(seed + '\n')
+    os.replace(path + '.tmp', path)
+
+def seed_id(seed):
+    """Short digest identifying a seed without revealing it."""
+    return hashlib.sha256(seed.encode()).hexdigest()[:16]
+
+class IdentityStore:
+    """
+    username -> synthetic identity (gender, ethnicity, fake name) shared across runs, prefixes and repos.
+    Identities are derived from a keyed hash of the username, so a seed always gives the same ones;
+    the store makes repeated cleans lookups and keeps identities fixed if the Faker data changes.
+    """
+    def __init__(self, path=None):
+        self.path = path or config.IDENTITY_MAP_PATH
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS identities (
+                seed_id TEXT, username TEXT, gender TEXT, ethnicity TEXT, fake_name TEXT,
+                PRIMARY KEY (seed_id, username)
+            )""")
+        self.seed = None
+        self.identities = {}
+        self.stats = {'stored': 0, 'generated': 0}
+
+    def default_seed(self):
+        """A random seed created on first use and kept in the store, so runs agree without configuration."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'default_seed'").fetchone()
+        if row: return row[0]
+        seed = secrets.token_hex(16)
+        self.conn.execute("INSERT INTO meta VALUES ('default_seed', ?)", (seed,))
+        self.conn.commit()
+        return seed
+
+    def use_seed(self, seed):
+        """Loads the identities stored for `seed` (only a digest of the seed is kept in the table)."""
+        self.seed = seed
+        self.seed_id = seed_id(seed)
+        self.identities = {username: (gender, ethnicity, fake_name) for username, gender, ethnicity, fake_name
+                           in self.conn.execute("SELECT username, gender, ethnicity, fake_name FROM identities "
+                                                "WHERE seed_id = ?", (self.seed_id,))}
+        print(f"Identity Map: {len(self.identities)} identities for this seed at {self.path}")
+
+    def lookup(self, usernames, generate):
+        """
+        (gender, ethnicity, fake_name) per username. `generate(usernames, draws)` is called once
+        for the usernames not stored yet, with username_draws rows, and returns the same tuples.
+        """
+        missing = sorted({u for u in usernames if u not in self.identities})
+        self.stats['stored'] += len(set(usernames)) - len(missing)
+        if missing:
+            new = generate(missing, username_draws(self.seed, missing, 4))
+            self.identities.update(zip(missing, new))
+            self.conn.executemany("INSERT OR REPLACE INTO identities VALUES (?, ?, ?, ?, ?)",
+                                  [(self.seed_id, u, *identity) for u, identity in zip(missing, new)])
+            self.conn.commit()
+            self.stats['generated'] += len(missing)
+        return [self.identities[u] for u in usernames]
+
+    def close(self, report=True):
+        self.conn.commit()
+        self.conn.close()
+        if report: print(f"Identity Map: {self.stats['stored']} looked up, {self.stats['generated']} generated.")
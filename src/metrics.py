@@ -0,0 +1,47 @@
+import bisect
+
+class LatencyHistogram:
+    """
+    Request latency histogram (seconds), printed at the end of a run to tune the HTTP settings.
+    Latencies are only counted (constant memory), in 10%-wide buckets for the percentiles.
+    """
+    BOUNDS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+    # 1 ms .. ~4 min, each bucket 10% wider than the one before
+    FINE_BOUNDS = [0.001 * 1.1 ** i for i in range(130)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.fine_counts = [0] * (len(self.FINE_BOUNDS) + 1)
+        self.total = 0
+        self.max = 0.0
+        self.statuses = {}
+
+    def record(self, seconds, status):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.fine_counts[bisect.bisect_left(self.FINE_BOUNDS, seconds)] += 1
+        self.total += 1
+        self.max = max(self.max, seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def percentile(self, p):
+        """Interpolated within its bucket, so within about 5% of the exact value."""
+        if not self.total: return 0.0
+        rank = p / 100 * self.total
+        seen = 0
+        for i, count in enumerate(self.fine_counts):
+            if count and seen + count >= rank:
+                low = self.FINE_BOUNDS[i - 1] if i > 0 else 0.0
+                high = self.FINE_BOUNDS[i] if i < len(self.FINE_BOUNDS) else self.max
+                return min(self.max, low + (high - low) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+    def report(self):
+        total = self.total
+        if not total: return
+        print(f"\nRequest Latency: {total} requests, p50 {self.percentile(50):.3f}s, "
+              f"p90 {self.percentile(90):.3f}s, p99 {self.percentile(99):.3f}s, max {self.max:.3f}s")
+        labels = [f"<= {b}s" for b in self.BOUNDS] + [f"> {self.BOUNDS[-1]}s"]
+        for label, count in zip(labels, self.counts):
+            if count: print(f"  {label:>8} {count:>7}  {'#' * max(1, round(40 * count / total))}")
+        print("  status: " + ", ".join(f"{s}={n}" for s, n in sorted(self.statuses.items(), key=lambda kv: str(kv[0]))))
@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import random
+import time
+import pandas as pd
+from aiohttp import web
+
+# Offline stand-in for the GitHub REST endpoints the scraper uses, for benchmarks and dry runs.
+# Point the scraper at it with config.GITHUB_API_URL = 'http://127.0.0.1:<port>'.
+
+def _iso(d):
+    return d.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def synthetic_fixtures(owner='mock', repo='repo', threads=500, users=200, seed=1):
+    """Generates a repo with a heavy-tailed comment distribution (most threads short, a few huge)."""
+    rng = random.Random(seed)
+    logins = [f"user{i}" for i in range(users)] + ['dependabot[bot]']
+    user_ids = {login: i + 1 for i, login in enumerate(logins)}
+    now = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def user(login):
+        return {'login': login, 'id': user_ids[login]}
+
+    items, comment_id = [], 10**8
+    for number in range(1, threads + 1):
+        created = now - datetime.timedelta(days=rng.randint(0, 1800), minutes=rng.randint(0, 1439))
+        comments = []
+        for k in range(min(int(rng.paretovariate(1.2)) - 1, 600)):
+            comment_id += 1
+            comments.append({
+                'id': comment_id, 'user': user(rng.choice(logins)), 'body': f"Comment {comment_id} on #{number}",
+                'created_at': _iso(created + datetime.timedelta(hours=k + 1)),
+                'html_url': f"https://github.com/{owner}/{repo}/issues/{number}#issuecomment-{comment_id}"
+            })
+        is_pr = rng.random() < 0.4
+        items.append({
+            'id': 10**7 + number, 'number': number, 'user': user(rng.choice(logins)),
+            'title': f"Thread {number}", 'body': f"Body of thread {number}",
+            'created_at': _iso(created), 'updated_at': comments[-1]['created_at'] if comments else _iso(created),
+            'html_url': f"https://github.com/{owner}/{repo}/{'pull' if is_pr else 'issues'}/{number}",
+            'is_pr': is_pr,
+            'pr_stats': {'commits': rng.randint(1, 20), 'changed_files': rng.randint(1, 30),
+                         'additions': rng.randint(0, 2000), 'deletions': rng.randint(0, 800)} if is_pr else None,
+            'reviewers': [rng.choice(logins) for _ in range(rng.randint(0, 3))] if is_pr else [],
+            'comments': comments
+        })
+
+    names = {login: (None if rng.random() < 0.2 else f"Name {login}") for login in logins}
+    return {'repos': {f"{owner}/{repo}": {'description': 'Synthetic benchmark repo', 'threads': items}},
+            'users': names, 'user_ids': user_ids}
+
+def fixtures_from_csv(path):
+    """Rebuilds fixtures from a recorded scrape (_FINAL.csv), so benchmarks replay a real repo's shape."""
+    df = pd.read_csv(path)
+    df = df.astype(object).where(df.notna(), None)
+    repos, names, user_ids = {}, {}, {}
+
+    for (full_name, thread_id), rows in df.groupby(['repo', 'thread_id'], sort=False):
+        repo = repos.setdefault(full_name, {'description': rows['workspace_title'].iloc[0], 'threads': []})
+        head = rows[rows['type'] != 'comment']
+        if head.empty: continue
+        head = head.iloc[0]
+
+        comments = []
+        for _, c in rows[rows['type'] == 'comment'].sort_values('created_at').iterrows():
+            comments.append({'id': int(c['record_id']), 'user': {'login': c['author_username'], 'id': int(c['author_id'])},
+                             'body': c['text_content'], 'created_at': c['created_at'], 'html_url': c['url']})
+        for _, r in rows.iterrows():
+            names[r['author_username']] = r['author_full_name']
+            user_ids[r['author_username']] = int(r['author_id'])
+
+        is_pr = head['type'] == 'pull_request_body'
+        # reviewers aren't recorded separately: collaborators who neither opened nor commented
+        commenters = {c['user']['login'] for c in comments}
+        collaborators = (head['collaborators_fake'] or '').split(',')
+        repo['threads'].append({
+            'id': int(head['record_id']), 'number': int(thread_id),
+            'user': {'login': head['author_username'], 'id': int(head['author_id'])},
+            'title': head['title'], 'body': head['text_content'],
+            'created_at': head['created_at'], 'updated_at': max([head['created_at']] + [c['created_at'] for c in comments]),
+            'html_url': head['url'], 'is_pr': is_pr,
+            'pr_stats': {k: head[k] for k in ['commits', 'changed_files', 'additions', 'deletions']} if is_pr else None,
+            'reviewers': [l for l in collaborators if l and l != head['author_username'] and l not in commenters],
+            'comments': comments
+        })
+    return {'repos': repos, 'users': names, 'user_ids': user_ids}
+
+def full_user(origin, user):
+    """A user object with the other fields GitHub sends along (URLs, node id, type...)."""
+    if user is None: return None
+    url = f"{origin}/users/{user['login']}"
+    return {**user, 'node_id': f"U_{user['id']:012d}", 'avatar_url': f"https://avatars.githubusercontent.com/u/{user['id']}?v=4",
+            'gravatar_id': '', 'url': url, 'html_url': f"https://github.com/{user['login']}",
+            **{f"{name}_url": f"{url}/{name}" for name in ['followers', 'following', 'gists', 'starred', 'subscriptions',
+                                                         'organizations', 'repos', 'events', 'received_events']},
+            'type': 'User', 'user_view_type': 'public', 'site_admin': False}
+
+def full_reactions(url):
+    return {'url': f"{url}/reactions", 'total_count': 0, '+1': 0, '-1': 0, 'laugh': 0, 'hooray': 0,
+            'confused': 0, 'heart': 0, 'rocket': 0, 'eyes': 0}
+
+def load_fixtures(path):
+    """Loads fixtures from a scrape CSV or a JSON file written by `--save-fixtures`."""
+    if path.endswith('.csv'):
+        return fixtures_from_csv(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class MockGitHub:
+    """
+    Serves `fixtures` with GitHub's pagination (Link headers), ETags and rate-limit headers.
+    Each token gets `rate_limit` requests per `window` seconds, after which it receives 403s until
+    X-RateLimit-Reset; `secondary` is the chance of a secondary rate limit 403 with Retry-After.
+    """
+    def __init__(self, fixtures, latency=0.0, jitter=0.5, rate_limit=5000, window=3600, secondary=0.0, seed=1,
+                 full_objects=False):
+        self.fixtures = fixtures
+        self.full_objects = full_objects  # pad objects to GitHub's real shape (the scraper only reads a few fields)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.window = window
+        self.secondary = secondary
+        self.rng = random.Random(seed)
+        self.comment_listings = {}  # (repo, since) -> sorted (comment, thread number) pairs
+
+        self.budgets = {}  # token -> {'remaining', 'reset'}
+        self.in_flight = 0
+        self.stats = {'requests': 0, 'rate_limited': 0, 'secondary_limited': 0, 'not_modified': 0, 'peak_in_flight': 0}
+
+        # sorted like GitHub's default issue listing (newest first)
+        self.threads = {}
+        for full_name, repo in fixtures['repos'].items():
+            repo['threads'].sort(key=lambda t: t['created_at'], reverse=True)
+            self.threads[full_name] = {t['number']: t for t in repo['threads']}
+
+    def app(self):
+        app = web.Application(middlewares=[self.middleware])
+        app.add_routes([
+            web.get('/_mock/stats', self.handle_stats),
+            web.get('/repos/{owner}/{repo}', self.handle_repo),
+            web.get('/repos/{owner}/{repo}/issues', self.handle_issues),
+            web.get('/repos/{owner}/{repo}/issues/comments', self.handle_repo_comments),
+            web.get('/repos/{owner}/{repo}/issues/{number}/comments', self.handle_comments),
+            web.get('/repos/{owner}/{repo}/pulls/{number}', self.handle_pull),
+            web.get('/repos/{owner}/{repo}/pulls/{number}/reviews', self.handle_reviews),
+            web.get('/users/{login}', self.handle_user),
+        ])
+        return app
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        if request.path.startswith('/_mock'): return await handler(request)
+
+        self.stats['requests'] += 1
+        self.in_flight += 1
+        self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency * self.rng.uniform(1 - self.jitter, 1 + self.jitter))
+            limited = self.rate_limited(request)
+            if limited is not None: return limited
+            return self.with_headers(request, await handler(request))
+        finally:
+            self.in_flight -= 1
+
+    def budget(self, request):
+        token = request.headers.get('Authorization', '')
+        now = time.time()
+        budget = self.budgets.get(token)
+        if budget is None or budget['reset'] <= now:
+            budget = self.budgets[token] = {'remaining': self.rate_limit, 'reset': int(now) + self.window}
+        return budget
+
+    def rate_limited(self, request):
+        """Returns a 403 response if this request is rate limited, else None."""
+        if self.secondary and self.rng.random() < self.secondary:
+            self.stats['secondary_limited'] += 1
+            return web.json_response({'message': 'You have exceeded a secondary rate limit.'}, status=403, headers={'Retry-After': '1'})
+
+        budget = self.budget(request)
+        if budget['remaining'] <= 0:
+            self.stats['rate_limited'] += 1
+            return web.json_response({'message': 'API rate limit exceeded.'}, status=403, headers=self.limit_headers(budget))
+        return None
+
+    def limit_headers(self, budget):
+        return {'X-RateLimit-Limit': str(self.rate_limit), 'X-RateLimit-Remaining': str(budget['remaining']),
+                'X-RateLimit-Reset': str(budget['reset']), 'X-RateLimit-Resource': 'core'}
+
+    def with_headers(self, request, response):
+        """Adds ETag (answering If-None-Match with a free 304) and charges the token's budget."""
+        budget = self.budget(request)
+        if response.status == 200 and response.body:
+            etag = '"' + hashlib.md5(response.body).hexdigest() + '"'
+            if request.headers.get('If-None-Match') == etag:
+                self.stats['not_modified'] += 1
+                return web.Response(status=304, headers={'ETag': etag, **self.limit_headers(budget)})
+            response.headers['ETag'] = etag
+        budget['remaining'] -= 1
+        response.headers.update(self.limit_headers(budget))
+        return response
+
+    def paginate(self, request, items, render=None):
+        """One page of `items` (each passed through `render`, if given) with GitHub's Link header."""
+        page = int(request.query.get('page', 1))
+        per_page = min(int(request.query.get('per_page', 30)), 100)
+        last = max(1, -(-len(items) // per_page))
+
+        links = []
+        if page < last:
+            links.append(f'<{request.url.update_query(page=page + 1)}>; rel="next"')
+            links.append(f'<{request.url.update_query(page=last)}>; rel="last"')
+        if page > 1:
+            links.append(f'<{request.url.update_query(page=1)}>; rel="first"')
+            links.append(f'<{request.url.update_query(page=page - 1)}>; rel="prev"')
+        chunk = items[(page - 1) * per_page: page * per_page]
+        if render: chunk = [render(item) for item in chunk]
+        return web.json_response(chunk, headers={'Link': ', '.join(links)} if links else {})
+
+    def thread(self, request):
+        full_name = f"{request.match_info['owner']}/{request.match_info['repo']}"
+        thread = self.threads.get(full_name, {}).get(int(request.match_info['number']))
+        if thread is None: raise web.HTTPNotFound()
+        return thread
+
+    def issue_json(self, request, full_name, thread):
+        base = f"{request.url.origin()}/repos/{full_name}"
+        issue = {k: thread[k] for k in ['id', 'number', 'user', 'title', 'body', 'created_at', 'updated_at', 'html_url']}
+        issue['comments'] = len(thread['comments'])
+        issue['comments_url'] = f"{base}/issues/{thread['number']}/comments"
+        if thread['is_pr']: issue['pull_request'] = {'url': f"{base}/pulls/{thread['number']}"}
+        if self.full_objects:
+            url = f"{base}/issues/{thread['number']}"
+            issue.update({
+                'url': url, 'repository_url': base, 'labels_url': f"{url}/labels{{/name}}", 'events_url': f"{url}/events",
+                'timeline_url': f"{url}/timeline", 'node_id': f"I_{thread['id']:012d}", 'user': full_user(request.url.origin(), thread['user']),
+                'labels': [{'id': 1000 + k, 'node_id': f"LA_{k:08d}", 'url': f"{base}/labels/label-{k}", 'name': f"label-{k}",
+                            'color': 'ededed', 'default': False, 'description': f"Label {k}"} for k in range(thread['number'] % 3)],
+                'state': 'open', 'locked': False, 'assignee': None, 'assignees': [], 'milestone': None,
+                'closed_at': None, 'author_association': 'CONTRIBUTOR', 'type': None, 'active_lock_reason': None,
+                'sub_issues_summary': {'total': 0, 'completed': 0, 'percent_completed': 0}, 'closed_by': None,
+                'reactions': full_reactions(url), 'performed_via_github_app': None, 'state_reason': None
+            })
+            if thread['is_pr']:
+                html = thread['html_url']
+                issue['pull_request'].update({'html_url': html, 'diff_url': f"{html}.diff", 'patch_url': f"{html}.patch", 'merged_at': None})
+        return issue
+
+    def comment_json(self, request, comment):
+        if not self.full_objects: return comment
+        url = f"{request.url.origin()}/repos/{request.match_info['owner']}/{request.match_info['repo']}/issues/comments/{comment['id']}"
+        return {**comment, 'url': url, 'node_id': f"IC_{comment['id']:012d}", 'user': full_user(request.url.origin(), comment['user']),
+                'updated_at': comment['created_at'], 'author_association': 'CONTRIBUTOR', 'reactions': full_reactions(url),
+                'performed_via_github_app': None}
+
+    async def handle_stats(self, request):
+        return web.json_response({**self.stats, 'repos': list(self.fixtures['repos'])})
+
+    async def handle_repo(self, request):
+        repo = self.fixtures['repos'].get(f"{request.match_info['owner']}/{request.match_info['repo']}")
+        if repo is None: raise web.HTTPNotFound()
+        return web.json_response({'description': repo['description']})
+
+    async def handle_issues(self, request):
+        full_name = f"{request.match_info['owner']}/{request.match_info['repo']}"
+        if full_name not in self.fixtures['repos']: raise web.HTTPNotFound()
+        threads = self.fixtures['repos'][full_name]['threads']
+        since = request.query.get('since')
+        if since: threads = [t for t in threads if t['updated_at'] >= since]
+        return self.paginate(request, threads, lambda t: self.issue_json(request, full_name, t))
+
+    async def handle_comments(self, request):
+        return self.paginate(request, self.thread(request)['comments'], lambda c: self.comment_json(request, c))
+
+    async def handle_repo_comments(self, request):
+        """Every thread's comments in one listing (oldest first), each with its thread's issue_url."""
+        full_name = f"{request.match_info['owner']}/{request.match_info['repo']}"
+        if full_name not in self.fixtures['repos']: raise web.HTTPNotFound()
+        base = f"{request.url.origin()}/repos/{full_name}/issues"
+        since = request.query.get('since')
+        # built once per listing, not for every page
+        key = (full_name, since)
+        if key not in self.comment_listings:
+            comments = [(c, t['number']) for t in self.fixtures['repos'][full_name]['threads']
+                        for c in t['comments'] if not since or c['created_at'] >= since]
+            comments.sort(key=lambda pair: (pair[0]['created_at'], pair[0]['id']))
+            self.comment_listings[key] = comments
+        return self.paginate(request, self.comment_listings[key],
+                             lambda pair: {**self.comment_json(request, pair[0]), 'issue_url': f"{base}/{pair[1]}"})
+
+    async def handle_pull(self, request):
+        thread = self.thread(request)
+        if not thread['is_pr']: raise web.HTTPNotFound()
+        return web.json_response(thread['pr_stats'])
+
+    async def handle_reviews(self, request):
+        ids = self.fixtures.get('user_ids', {})
+        reviews = [{'user': {'login': login, 'id': ids.get(login)}} for login in self.thread(request)['reviewers']]
+        return self.paginate(request, reviews)
+
+    async def handle_user(self, request):
+        login = request.match_info['login']
+        if login not in self.fixtures['users']: raise web.HTTPNotFound()
+        return web.json_response({'login': login, 'name': self.fixtures['users'][login]})
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline GitHub REST API stand-in")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', type=str, help="Scrape _FINAL.csv or fixtures JSON to replay (default: synthetic)")
+    parser.add_argument('--threads', type=int, default=500, help="Synthetic threads to generate")
+    parser.add_argument('--repo', type=str, default='mock/repo', help="owner/repo of the synthetic repo")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mean response latency in seconds")
+    parser.add_argument('--rate-limit', type=int, default=5000, help="Requests per token per window")
+    parser.add_argument('--window', type=int, default=3600, help="Rate-limit window in seconds")
+    parser.add_argument('--secondary', type=float, default=0.0, help="Probability of a secondary rate limit 403")
+    parser.add_argument('--full-objects', action='store_true', help="Serve issues/comments with all of GitHub's fields")
+    parser.add_argument('--save-fixtures', type=str, help="Write the fixtures to this JSON file and exit")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        fixtures = load_fixtures(args.fixtures)
+    else:
+        owner, repo = args.repo.split('/')
+        fixtures = synthetic_fixtures(owner, repo, args.threads)
+
+    if args.save_fixtures:
+        with open(args.save_fixtures, 'w', encoding='utf-8') as f:
+            json.dump(fixtures, f)
+        print(f"Saved fixtures for {', '.join(fixtures['repos'])} to {args.save_fixtures}")
+        return
+
+    server = MockGitHub(fixtures, latency=args.latency, rate_limit=args.rate_limit,
+                        window=args.window, secondary=args.secondary, full_objects=args.full_objects)
+    print(f"Mock GitHub: serving {', '.join(fixtures['repos'])} on http://127.0.0.1:{args.port}")
+    web.run_app(server.app(), host='127.0.0.1', port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
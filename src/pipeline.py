@@ -10,15 +10,113 @@ from src import config
 from src import scraper
 from src import processor
 from src import cleaner
-
-def create_new_run_folder(base_name="run"):
+from src import identities
+from src import storage
+from src.stage_cache import StageCache
+from src.streaming import ThreadStream
+
+# config values each stage's output depends on (part of its stage cache key)
+PROCESS_SETTINGS = [
+    'TARGET_EMAIL_DOMAIN', 'FILTER_TIME_CUTOFF_MONTHS', 'FILTER_MIN_COMMENTS_PER_CASE', 'FILTER_MIN_CASES_PER_USER',
+    'FILTER_BOT_KEYWORDS', 'LTC_MIN_YEARS_ACTIVE', 'LTC_WINDOW_MONTHS', 'LTC_MIN_ACTIVE_WINDOWS',
+    'LTC_MIN_CASES_PER_WINDOW', 'LTC_MIN_COMMENTS_QUALITY', 'STAGE_FORMAT', 'STAGE_COMPRESSION'
+]
+CLEAN_TABLES = ['workspaces', 'users', 'workspace_members', 'contexts', 'context_comments']
+
+def create_new_run_folder(base_name="run", owner=None, repo=None):
     """Creates a fresh timestamped directory."""
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    folder_name = f"{config.OWNER}-{config.REPO}_{base_name}_{timestamp}"
+    folder_name = f"{owner or config.OWNER}-{repo or config.REPO}_{base_name}_{timestamp}"
     full_path = os.path.join(config.BASE_DATA_DIR, folder_name)
     os.makedirs(full_path, exist_ok=True)
     return full_path
 
+def parse_repos(args):
+    """Reads `owner/repo` targets from --repos / --repos-file, defaulting to config.OWNER/REPO."""
+    specs = []
+    if args.repos:
+        specs.extend(args.repos.split(','))
+    if args.repos_file:
+        with open(args.repos_file, 'r', encoding='utf-8') as f:
+            specs.extend(line.split('#')[0] for line in f)
+
+    repos = []
+    for spec in (s.strip() for s in specs):
+        if not spec: continue
+        if spec.count('/') != 1:
+            print(f"[ERROR] Invalid repository '{spec}', expected owner/repo.")
+            sys.exit(1)
+        repos.append(tuple(spec.split('/')))
+    return repos or [(config.OWNER, config.REPO)]
+
+def run_processing(input_file, mode, run_dir=None):
+    """Stage 2 for one scrape file (into run_dir if given, e.g. by --stream). Returns the run folder, or None on failure."""
+    # validation
+    if not input_file or not os.path.exists(input_file):
+        print(f"[ERROR] Processing requires --input-file. File not found: {input_file}")
+        return None
+
+    # create a NEW folder for this processing run
+    # (so original scrape folder isnt polluted with multiple experiments)
+    run_dir = run_dir or create_new_run_folder("PROCESS")
+    config.OUTPUT_DIR = run_dir
+    print(f"[SETUP] Processing Input: {input_file}")
+    print(f"[SETUP] Output Directory: {run_dir}")
+
+    def compute():
+        if config.PROCESS_CHUNKED:
+            # out-of-core: reads the file itself, two passes
+            try:
+                processor.run_chunked_pipelines(input_file, mode)
+            except Exception as e:
+                print(f"[ERROR] Chunked processing of {input_file} failed: {e}")
+                return False
+            return True
+
+        # load Data (typed Parquet if the scraper wrote one, else CSV)
+        try:
+            raw_data = storage.read_records(input_file)
+        except Exception as e:
+            print(f"[ERROR] Failed to read {input_file}: {e}")
+            return False
+
+        # run Processor (standard and LTC share one preparation)
+        processor.run_pipelines(raw_data, mode)
+        return True
+
+    settings = {name: getattr(config, name) for name in PROCESS_SETTINGS}
+    settings['mode'] = mode
+    # the time filter counts back from today, so its results only carry over within the day
+    if config.FILTER_TIME_CUTOFF_MONTHS > 0:
+        settings['date'] = datetime.date.today().isoformat()
+
+    if not StageCache().run('process', run_dir, [input_file], settings, [processor, storage], compute):
+        return None
+    return run_dir
+
+def run_cleaning(input_dir):
+    """Stage 3 for one processed folder. Returns False on failure."""
+    # validation
+    if not input_dir or not os.path.exists(input_dir):
+        print(f"[ERROR] Cleaning requires --input-dir. Directory not found: {input_dir}")
+        return False
+
+    # point config to the directory containing the processed files
+    config.OUTPUT_DIR = input_dir
+    print(f"[SETUP] Cleaning Directory: {config.OUTPUT_DIR}")
+
+    # identities depend on the seed the cleaner will use
+    identity_store = identities.IdentityStore()
+    seed = identities.resolve_seed(input_dir, identity_store)
+    identity_store.close(report=False)
+
+    inputs = [storage.find_table(prefix + name) for prefix in ['', 'ltc_'] for name in CLEAN_TABLES]
+    settings = {'seed_id': identities.seed_id(seed)}
+
+    # run Cleaner
+    return StageCache().run('clean', input_dir, [path for path in inputs if path], settings,
+                            [cleaner, identities, storage], cleaner.main)
+
 def main():
     parser = argparse.ArgumentParser(description="ClarityLoop Data Pipeline")
     
@@ -29,9 +127,18 @@ def main():
     
     # --- CONFIGURATION ARGS ---
     parser.add_argument('--mode', choices=['standard', 'ltc', 'all'], default='all', help="Processing mode (Standard/LTC)")
+    parser.add_argument('--backend', choices=['rest', 'graphql'], help="Scraper fetch backend (default: config.SCRAPE_BACKEND)")
+    parser.add_argument('--incremental', action='store_true', help="Only refetch threads changed since the last scrape")
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the persistent HTTP response cache")
+    parser.add_argument('--chunked', action='store_true', help="Out-of-core processing for scrapes larger than memory")
+    parser.add_argument('--recompute', action='store_true', help="Recompute --process/--clean even if cached")
+    parser.add_argument('--stream', action='store_true', help="Filter threads and write partial tables while scraping")
+    parser.add_argument('--pushdown', action='store_true', help="Don't expand threads the --mode pipelines can't keep")
     
     # --- INPUT HANDLING ---
-    parser.add_argument('--input-file', type=str, help="Path to an existing _FINAL.csv (for Processing step)")
+    parser.add_argument('--repos', type=str, help="Comma-separated owner/repo list to scrape in one batch")
+    parser.add_argument('--repos-file', type=str, help="File with one owner/repo per line to scrape in one batch")
+    parser.add_argument('--input-file', type=str, help="Path to an existing _FINAL.parquet/_FINAL.csv (for Processing step)")
     parser.add_argument('--input-dir', type=str, help="Path to an existing folder (for Cleaning step)")
     
     args = parser.parse_args()
@@ -40,87 +147,92 @@ def main():
     if not (args.scrape or args.process or args.clean):
         args.scrape = args.process = args.clean = True
 
+    if args.chunked: config.PROCESS_CHUNKED = True
+    if args.recompute: config.STAGE_CACHE_ENABLED = False
+    if args.stream and not (args.scrape and args.process):
+        print("[WARN] --stream needs both --scrape and --process; running the stages one after another.")
+        args.stream = False
+    if args.stream and args.mode == 'ltc':
+        print("[WARN] --stream only builds partial STANDARD tables; LTC is processed after the scrape.")
+
+    # one job per repository; without --repos this is just config.OWNER/REPO
+    jobs = [{'owner': owner, 'repo': repo, 'input_file': args.input_file, 'input_dir': args.input_dir}
+            for owner, repo in parse_repos(args)]
+    failed = False
+
     # SCRAPER
     if args.scrape:
         print("\n" + "="*40)
         print("STAGE 1: SCRAPING")
         print("="*40)
         
-        # create a new folder for this scrape
-        run_dir = create_new_run_folder("SCRAPE")
-        config.OUTPUT_DIR = run_dir
-        print(f"[SETUP] Output Directory: {run_dir}")
-
-        # run Scraper
-        asyncio.run(scraper.main())
-        
-        # automatically pass this output to the next stage if running continuously
-        # find the file we just created to pass to the processor
+        # create a new folder per repo for this scrape
+        targets = []
+        for job in jobs:
+            run_dir = create_new_run_folder("SCRAPE", job['owner'], job['repo'])
+            target = scraper.RepoTarget(job['owner'], job['repo'], run_dir)
+            print(f"[SETUP] Output Directory: {run_dir}")
+
+            # streaming: the process folder exists from the start and fills up during the scrape
+            if args.stream:
+                job['process_dir'] = create_new_run_folder("PROCESS", job['owner'], job['repo'])
+                target.stream = ThreadStream(target.full_name, job['process_dir'])
+                print(f"[SETUP] Streaming partial tables to: {target.stream.partial_dir}")
+            targets.append(target)
+        config.OUTPUT_DIR = targets[0].output_dir
+
+        # run Scraper (all repos share one session, token scheduler and profile store)
+        config.INCREMENTAL = config.INCREMENTAL or args.incremental
+        if args.backend: config.SCRAPE_BACKEND = args.backend
+        if args.no_cache: config.HTTP_CACHE_ENABLED = False
+        if args.pushdown: config.PUSHDOWN_FILTERS = args.mode
         try:
-            import glob
-            files = glob.glob(os.path.join(run_dir, "*_FINAL.csv"))
-            if files:
-                args.input_file = max(files, key=os.path.getctime)
-        except Exception:
-            print("[WARN] Scraper finished but couldn't auto-detect output file.")
-
-    # PROCESSOR
-    if args.process:
-        print("\n" + "="*40)
-        print("STAGE 2: PROCESSING")
-        print("="*40)
-
-        # validation
-        if not args.input_file or not os.path.exists(args.input_file):
-            print(f"[ERROR] Processing requires --input-file. File not found: {args.input_file}")
-            sys.exit(1)
-
-        # create a NEW folder for this processing run
-        # (so original scrape folder isnt polluted with multiple experiments)
-        run_dir = create_new_run_folder("PROCESS")
-        config.OUTPUT_DIR = run_dir
-        print(f"[SETUP] Processing Input: {args.input_file}")
-        print(f"[SETUP] Output Directory: {run_dir}")
+            asyncio.run(scraper.main(targets))
+        finally:
+            for target in targets:
+                if target.stream: target.stream.close()
 
-        # load Data
-        import pandas as pd
-        try:
-            raw_data = pd.read_csv(args.input_file)
-        except Exception as e:
-            print(f"[ERROR] Failed to read CSV: {e}")
-            sys.exit(1)
-
-        # run Processor
-        if args.mode in ['standard', 'all']:
-            processor.run_standard_pipeline(raw_data)
-        
-        if args.mode in ['ltc', 'all']:
-            processor.run_ltc_pipeline(raw_data)
-
-        # pass this directory to the cleaner
-        args.input_dir = run_dir
-
-    # CLEANER
-    if args.clean:
-        print("\n" + "="*40)
-        print("STAGE 3: CLEANING")
-        print("="*40)
-
-        # validation
-        if not args.input_dir or not os.path.exists(args.input_dir):
-            print(f"[ERROR] Cleaning requires --input-dir. Directory not found: {args.input_dir}")
-            sys.exit(1)
-
-        # point config to the directory containing the processed files
-        config.OUTPUT_DIR = args.input_dir
-        print(f"[SETUP] Cleaning Directory: {config.OUTPUT_DIR}")
-
-        # run Cleaner
-        cleaner.main()
+        # automatically pass this output to the next stage if running continuously
+        for job, target in zip(jobs, targets):
+            if target.final_file:
+                job['input_file'] = target.final_file
+            else:
+                print(f"[WARN] Scraper finished without a final output file for {target.full_name}.")
+
+    for job in jobs:
+        # processor/cleaner name their folders after the current repo
+        config.OWNER, config.REPO = job['owner'], job['repo']
+
+        # PROCESSOR
+        if args.process:
+            print("\n" + "="*40)
+            print(f"STAGE 2: PROCESSING ({job['owner']}/{job['repo']})")
+            print("="*40)
+
+            run_dir = run_processing(job['input_file'], args.mode, job.get('process_dir'))
+            if run_dir is None:
+                failed = True
+                continue
+            # the final tables supersede the partial ones written during the scrape
+            if job.get('process_dir'): shutil.rmtree(os.path.join(run_dir, 'partial'), ignore_errors=True)
+
+            # pass this directory to the cleaner
+            job['input_dir'] = run_dir
+
+        # CLEANER
+        if args.clean:
+            print("\n" + "="*40)
+            print(f"STAGE 3: CLEANING ({job['owner']}/{job['repo']})")
+            print("="*40)
+
+            if not run_cleaning(job['input_dir']):
+                failed = True
+
+    if failed: sys.exit(1)
 
     print("\n" + "="*40)
     print("[PIPELINE] COMPLETE")
     print("="*40)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,22 +1,33 @@
+import numpy as np
 import pandas as pd
 import argparse
 import os
 import glob
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from src import config
+from src import storage
 
-def load_latest_data():
-    """Finds the most recent _FINAL.csv from the scraper."""
-    search_path = os.path.join(config.OUTPUT_DIR, "*_FINAL.csv")
-    files = glob.glob(search_path)
+def latest_data_file():
+    """Finds the most recent _FINAL.parquet (or _FINAL.csv) from the scraper."""
+    files = (glob.glob(os.path.join(config.OUTPUT_DIR, "*_FINAL.parquet"))
+             or glob.glob(os.path.join(config.OUTPUT_DIR, "*_FINAL.csv")))
     if not files:
-        raise FileNotFoundError(f"No '_FINAL.csv' files found in {config.OUTPUT_DIR}. Run scraper first.")
-    latest_file = max(files, key=os.path.getctime)
+        raise FileNotFoundError(f"No '_FINAL' files found in {config.OUTPUT_DIR}. Run scraper first.")
+    return max(files, key=os.path.getctime)
+
+def load_latest_data():
+    latest_file = latest_data_file()
     print(f"Loading data from: {latest_file}")
-    return pd.read_csv(latest_file)
+    return storage.read_records(latest_file)
 
 def prepare_dataframe(raw_df):
-    """Common setup: datetime conversion and bot filtering."""
-    df = raw_df.copy()
+    """
+    Common setup: datetime conversion and bot filtering. The text columns are left out
+    (filters never read them); export_clarityloop_files takes them from raw_df at write time.
+    """
+    df = raw_df[[c for c in raw_df.columns if c not in storage.TEXT_COLUMNS]].copy()
     df['created_at'] = pd.to_datetime(df['created_at'], utc=True)
 
     # bot filter
@@ -25,76 +36,125 @@ def prepare_dataframe(raw_df):
     
     return df
 
-def export_clarityloop_files(df, raw_df, prefix=""):
+def text_column(df, raw_df, column):
+    """
+    `column` for the rows of `df`, looked up in raw_df (by index) if prepare_dataframe dropped it.
+    In chunked mode raw_df is a storage.TextSpill holding just the selected rows' text.
+    """
+    if column in df.columns: return df[column]
+    if isinstance(raw_df, storage.TextSpill): return raw_df.lookup(df, column)
+    return raw_df[column].loc[df.index]
+
+def row_chunks(df, chunk_rows):
+    """Slices of df with at most chunk_rows rows (a single empty one if df is empty)."""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+def parent_url_index(raw_df):
+    """record_id -> url over the RAW dataframe, so comments find their parent even if it was filtered out."""
+    first = ~raw_df['record_id'].duplicated()
+    return pd.Series(raw_df['url'][first].to_numpy(), index=raw_df['record_id'][first].to_numpy())
+
+def export_clarityloop_files(df, raw_df, prefix="", parent_urls=None, chunk_rows=None):
     """
-    Shared function to generate the 5 CSVs.
+    Shared function to generate the 5 ClarityLoop tables (Parquet until the cleaner writes the CSVs).
     Args:
-        df: The filtered DataFrame to export.
-        raw_df: The original full DataFrame (needed for mapping parent URLs).
+        df: The filtered DataFrame to export (text columns may be missing, see prepare_dataframe).
+        raw_df: The original full DataFrame (text columns and parent URLs), or a storage.TextSpill.
         prefix: Optional prefix for filenames (e.g., 'ltc_').
+        parent_urls: parent_url_index(raw_df), if already built.
+        chunk_rows: Rows per chunk when writing the text tables (default storage.WRITE_CHUNK_ROWS).
     """
     if df.empty:
         print(f"Dataset empty. No files generated for prefix '{prefix}'.")
         return
 
-    print(f"\nGenerating CSVs with prefix '{prefix}'...")
-    
+    print(f"\nGenerating tables with prefix '{prefix}'...")
+
+    # chunks are built here while a background thread encodes/compresses the previous one
+    with ThreadPoolExecutor(1) as pool:
+        for name, data, rows in clarityloop_tables(df, raw_df, parent_urls, chunk_rows):
+            seconds, size = timed_write(data, storage.stage_path(f'{prefix}{name}'),
+                                        pool if config.EXPORT_BACKGROUND_WRITES else None)
+            print(f"-> {prefix}{name}: {rows} rows, {seconds:.2f}s, {size / 1024 / 1024:.2f} MB")
+
+def clarityloop_tables(df, raw_df, parent_urls=None, chunk_rows=None):
+    """
+    The 5 ClarityLoop tables of a non-empty filtered frame as (name, data, rows). data is a DataFrame,
+    or for contexts/comments a generator of chunks (text is only materialized one chunk at a time).
+    """
+    chunk_rows = chunk_rows or storage.WRITE_CHUNK_ROWS
+
     # ensure email column exists
     if 'author_email_fake' not in df.columns:
         df['author_email_fake'] = df['author_username'] + '@' + config.TARGET_EMAIL_DOMAIN
 
+    # one grouped pass: integer codes for the dedup keys, shared by the workspace/user/member tables
+    ws_name, _ = pd.factorize(df['workspace_name'])
+    ws_title, _ = pd.factorize(df['workspace_title'])
+    email, _ = pd.factorize(df['author_email_fake'])
+
     # 1. workspaces
-    ws = df[['workspace_name', 'workspace_title']].drop_duplicates().copy()
+    ws = df.loc[first_rows(ws_name, ws_title), ['workspace_name', 'workspace_title']]
     ws['owner_email'] = f"owner@{config.TARGET_EMAIL_DOMAIN}"
     ws = ws.rename(columns={'workspace_title': 'title'})
-    ws.to_csv(os.path.join(config.OUTPUT_DIR, f'{prefix}workspaces.csv'), index=False)
 
     # 2. users
-    us = df[['author_full_name', 'author_email_fake']].drop_duplicates('author_email_fake').copy()
+    us = df.loc[first_rows(email), ['author_full_name', 'author_email_fake']]
     us = us.rename(columns={'author_full_name': 'name', 'author_email_fake': 'email'})
     us['gender'] = 'UNKNOWN'
     us['ethnicity'] = 'UNKNOWN'
-    us.to_csv(os.path.join(config.OUTPUT_DIR, f'{prefix}users.csv'), index=False)
 
     # 3. members
-    mem = df[['workspace_name', 'author_email_fake']].drop_duplicates().copy()
+    mem = df.loc[first_rows(ws_name, email), ['workspace_name', 'author_email_fake']]
     mem = mem.rename(columns={'author_email_fake': 'user_email'})
     mem['role'] = 'MEMBER'
     mem['title'] = 'Contributor'
     mem['manager_email'] = f"manager@{config.TARGET_EMAIL_DOMAIN}"
-    mem.to_csv(os.path.join(config.OUTPUT_DIR, f'{prefix}workspace_members.csv'), index=False)
-
-    # 4. contexts (cases/PRs)
-    ctx = df[df['parent_id'].isna()].copy()
-    ctx = ctx.rename(columns={
-        'author_email_fake': 'author_email', 'url': 'link', 'text_content': 'body',
-        'author_username': 'user', 'collaborators_fake': 'collaborators'
-    })
-    ctx['description'] = ctx['body'].str.slice(0, 200) + '...'
-    for col in ['author', 'content', 'key', 'reporter']: ctx[col] = None
-    
-    ctx_cols = ['workspace_name', 'author_email', 'link', 'context_type', 'title', 'created_at',
-                'user', 'description', 'body', 'author', 'content', 'key', 'reporter', 'collaborators']
-    ctx[ctx_cols].to_csv(os.path.join(config.OUTPUT_DIR, f'{prefix}contexts.csv'), index=False)
-
-    # 5. comments
-    com = df[df['parent_id'].notna()].copy()
-    # create mapping from RAW dataframe to ensure we find parents even if parent was filtered out
-    parent_urls = raw_df.drop_duplicates('record_id').set_index('record_id')['url']
-    
-    com['context_link'] = com['parent_id'].map(parent_urls)
-    com = com.rename(columns={
-        'author_email_fake': 'comment_author_email',
-        'text_content': 'comment_content',
-        'url': 'comment_link'
-    })
-    com[['context_link', 'comment_author_email', 'comment_content', 'comment_link']].to_csv(os.path.join(config.OUTPUT_DIR, f'{prefix}context_comments.csv'), index=False)
-
-    print(f"-> {prefix}workspaces.csv: {len(ws)}")
-    print(f"-> {prefix}users.csv: {len(us)}")
-    print(f"-> {prefix}workspace_members.csv: {len(mem)}")
-    print(f"-> {prefix}contexts.csv: {len(ctx)}")
-    print(f"-> {prefix}context_comments.csv: {len(com)}")
+
+    # 4. contexts (cases/PRs); text is only materialized for one chunk of rows at a time
+    ctx = df[df['parent_id'].isna()]
+
+    def context_chunks():
+        for part in row_chunks(ctx, chunk_rows):
+            body = text_column(part, raw_df, 'text_content')
+            yield pd.DataFrame({
+                'workspace_name': part['workspace_name'], 'author_email': part['author_email_fake'], 'link': part['url'],
+                'context_type': part['context_type'], 'title': text_column(part, raw_df, 'title'), 'created_at': part['created_at'],
+                'user': part['author_username'], 'description': body.str.slice(0, 200) + '...', 'body': body,
+                'author': None, 'content': None, 'key': None, 'reporter': None, 'collaborators': part['collaborators_fake']
+            })
+
+    # 5. comments (the bulk of the text)
+    com = df[df['parent_id'].notna()]
+    if parent_urls is None: parent_urls = parent_url_index(raw_df)
+
+    def comment_chunks():
+        for part in row_chunks(com, chunk_rows):
+            yield pd.DataFrame({
+                'context_link': part['parent_id'].map(parent_urls).astype('string'),
+                'comment_author_email': part['author_email_fake'],
+                'comment_content': text_column(part, raw_df, 'text_content'), 'comment_link': part['url']
+            })
+
+    return [('workspaces', ws, len(ws)), ('users', us, len(us)), ('workspace_members', mem, len(mem)),
+            ('contexts', context_chunks(), len(ctx)), ('context_comments', comment_chunks(), len(com))]
+
+def first_rows(*codes):
+    """Mask of the first row of each distinct combination of factorize codes (like drop_duplicates)."""
+    key = np.zeros(len(codes[0]), dtype=np.int64)
+    for c in codes:
+        key = key * (int(c.max(initial=-1)) + 2) + (c + 1)
+    return ~pd.Index(key).duplicated()
+
+def timed_write(data, path, pool=None):
+    """Writes a frame (or an iterator of chunks) to path. Returns (seconds, bytes)."""
+    start = time.perf_counter()
+    if isinstance(data, pd.DataFrame):
+        storage.write_table(data, path)
+    else:
+        storage.write_chunks(data, path, pool)
+    return time.perf_counter() - start, os.path.getsize(path)
 
 def print_stats(final_df):
     """Prints richness analysis stats."""
@@ -107,7 +167,8 @@ def print_stats(final_df):
     # top users
     print("\n--- Top 20 Users by Contribution & Engagement ---")
     case_feedback = final_df[final_df['parent_id'].notna()].groupby('thread_id').size().reset_index(name='fb_count')
-    cases = final_df[final_df['parent_id'].isna()].merge(case_feedback, on='thread_id', how='left').fillna(0)
+    cases = final_df[final_df['parent_id'].isna()].merge(case_feedback, on='thread_id', how='left')
+    cases['fb_count'] = cases['fb_count'].fillna(0)
 
     user_richness = cases.groupby(['author_username', 'author_email_fake']).agg(
         total_cases=('thread_id', 'count'),
@@ -129,12 +190,18 @@ def print_stats(final_df):
 
 
 # Pipeline 1: standard filtering
-def run_standard_pipeline(raw_df):
+def run_standard_pipeline(raw_df, prepared=None, parent_urls=None):
     print("\n--- Running STANDARD Pipeline ---")
     
     # 1. common prep (datetime & bots)
-    df = prepare_dataframe(raw_df)
+    df = prepare_dataframe(raw_df) if prepared is None else prepared
+
+    final_df = select_standard(df)
+    export_clarityloop_files(final_df, raw_df, prefix="", parent_urls=parent_urls)
+    print_stats(final_df)
 
+def select_standard(df):
+    """Rows of a prepared frame the standard pipeline keeps, sorted by thread."""
     # 2. time filter
     if config.FILTER_TIME_CUTOFF_MONTHS > 0:
         cutoff = pd.Timestamp.now(tz='UTC') - pd.DateOffset(months=config.FILTER_TIME_CUTOFF_MONTHS)
@@ -154,44 +221,57 @@ def run_standard_pipeline(raw_df):
     active_threads = case_starters[case_starters['author_id'].isin(valid_users)]['thread_id']
     df_active_users = df[df['thread_id'].isin(active_threads)]
 
-    final_df = pd.concat([df_valuable_threads, df_active_users]).drop_duplicates(subset=['record_id']).sort_values(by=['thread_id', 'created_at'])
+    return pd.concat([df_valuable_threads, df_active_users]).drop_duplicates(subset=['record_id']).sort_values(by=['thread_id', 'created_at'])
 
-    export_clarityloop_files(final_df, raw_df, prefix="")
-    print_stats(final_df)
+def find_consistent_users(case_starters, latest_date, years=None, window_months=None, min_windows=None, min_cases=None):
+    """
+    Users with at least `min_cases` cases in at least `min_windows` of the `window_months` windows
+    covering the `years` before `latest_date` (default: every window). Vectorized, one pass.
+    """
+    years = config.LTC_MIN_YEARS_ACTIVE if years is None else years
+    window_months = window_months or config.LTC_WINDOW_MONTHS
+    n_windows = years * 12 // window_months
+    min_windows = min_windows or config.LTC_MIN_ACTIVE_WINDOWS or n_windows
+    min_cases = min_cases or config.LTC_MIN_CASES_PER_WINDOW
+
+    # window k covers (latest - (k+1) windows, latest - k windows]
+    edges = pd.DatetimeIndex([latest_date - pd.DateOffset(months=k * window_months) for k in range(n_windows, -1, -1)])
+    created = pd.DatetimeIndex(case_starters['created_at']).as_unit('ns').asi8
+    slot = np.searchsorted(edges.as_unit('ns').asi8, created, side='left')
+    in_range = (slot >= 1) & (slot <= n_windows)
+
+    # (user, window) case counts as one bincount over integer user codes
+    codes, users = pd.factorize(case_starters['author_username'].to_numpy()[in_range])
+    counts = np.bincount(codes * n_windows + (slot[in_range] - 1), minlength=len(users) * n_windows)
+    active_windows = (counts.reshape(len(users), n_windows) >= min_cases).sum(axis=1)
+    return pd.Index(users[active_windows >= min_windows])
 
 # Pipeline 2: LTC filtering 
-def run_ltc_pipeline(raw_df):
+def run_ltc_pipeline(raw_df, prepared=None, parent_urls=None):
     print("\n--- Running LONG-TERM CONTRIBUTOR Pipeline ---")
     
     # 1. common prep (datetime & bots)
-    df = prepare_dataframe(raw_df)
+    df = prepare_dataframe(raw_df) if prepared is None else prepared
 
+    final_df = select_ltc(df)
+    export_clarityloop_files(final_df, raw_df, prefix="ltc_", parent_urls=parent_urls)
+    print_stats(final_df)
+
+def select_ltc(df):
+    """Rows of a prepared frame the LTC pipeline keeps."""
     # 2. identify consistent users
     latest_date = df['created_at'].max()
     cutoff_date = latest_date - pd.DateOffset(years=config.LTC_MIN_YEARS_ACTIVE)
     
     case_starters = df[df['type'].isin(['issue_body', 'pull_request_body'])]
-    consistent_users = []
 
     print(f"Checking consistency for {config.LTC_MIN_YEARS_ACTIVE} years...")
-    
-    for username, group in case_starters.groupby('author_username'):
-        is_consistent = True
-        for i in range(config.LTC_MIN_YEARS_ACTIVE):
-            w_end = latest_date - pd.DateOffset(years=i)
-            w_start = latest_date - pd.DateOffset(years=i+1)
-            
-            has_case = not group[(group['created_at'] > w_start) & (group['created_at'] <= w_end)].empty
-            if not has_case:
-                is_consistent = False
-                break
-        if is_consistent:
-            consistent_users.append(username)
+    consistent_users = find_consistent_users(case_starters, latest_date)
 
     print(f"Found {len(consistent_users)} consistent users.")
 
     # 3. filter data
-    ltc_df = df[df['author_username'].isin(consistent_users)].copy()
+    ltc_df = df[df['author_username'].isin(consistent_users)]
     ltc_df = ltc_df[ltc_df['created_at'] > cutoff_date]
 
     # 4. quality control
@@ -199,20 +279,67 @@ def run_ltc_pipeline(raw_df):
     valid_threads = comments.groupby('thread_id').size()
     valid_ids = valid_threads[valid_threads >= config.LTC_MIN_COMMENTS_QUALITY].index
     
-    final_df = ltc_df[ltc_df['thread_id'].isin(valid_ids)].copy()
+    return ltc_df[ltc_df['thread_id'].isin(valid_ids)]
 
-    export_clarityloop_files(final_df, raw_df, prefix="ltc_")
-    print_stats(final_df)
+def run_pipelines(raw_df, mode='all'):
+    """Runs the requested pipelines on one shared preparation (and parent-URL index) of raw_df."""
+    df = prepare_dataframe(raw_df)
+    parent_urls = parent_url_index(raw_df)
+
+    if mode in ['standard', 'all']:
+        run_standard_pipeline(raw_df, df, parent_urls)
+    
+    if mode in ['ltc', 'all']:
+        run_ltc_pipeline(raw_df, df, parent_urls)
+
+def run_chunked_pipelines(path, mode='all'):
+    """
+    Out-of-core run_pipelines for scrape files whose text doesn't fit in memory, same output.
+    Pass 1 reads only the metadata columns and selects each pipeline's rows; pass 2 streams the
+    text columns once, spilling the selected rows' text to disk (next to the output) in export order.
+    """
+    raw_meta = storage.read_records(path, storage.METADATA_COLUMNS)
+    df = prepare_dataframe(raw_meta)
+    parent_urls = parent_url_index(raw_meta)
+    del raw_meta
+
+    # pass 1: thread/user counts and LTC windows only need metadata
+    selections = []
+    if mode in ['standard', 'all']:
+        print("\n--- Selecting STANDARD rows ---")
+        selections.append(("", select_standard(df)))
+    if mode in ['ltc', 'all']:
+        print("\n--- Selecting LONG-TERM CONTRIBUTOR rows ---")
+        selections.append(("ltc_", select_ltc(df)))
+    del df
+
+    with tempfile.TemporaryDirectory(prefix='.spill_', dir=config.OUTPUT_DIR) as spill_dir:
+        spills = [storage.TextSpill(final_df, os.path.join(spill_dir, prefix or 'standard'), storage.TEXT_COLUMNS,
+                                    config.PROCESS_CHUNK_ROWS) for prefix, final_df in selections]
+
+        # pass 2: route the selected rows' text
+        print(f"\n[CHUNKED] Streaming text columns from {path}...")
+        for chunk in storage.iter_records(path, storage.TEXT_COLUMNS, config.PROCESS_CHUNK_ROWS):
+            for spill in spills:
+                spill.add(chunk)
+        for spill in spills:
+            spill.close()
+
+        for (prefix, final_df), spill in zip(selections, spills):
+            export_clarityloop_files(final_df, spill, prefix=prefix, parent_urls=parent_urls,
+                                     chunk_rows=config.PROCESS_CHUNK_ROWS)
+            print_stats(final_df)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process ClarityLoop Datasets")
     parser.add_argument('--mode', choices=['standard', 'ltc', 'all'], default='all', help="Which pipeline to run")
+    parser.add_argument('--chunked', action='store_true', help="Out-of-core mode for scrapes larger than memory")
     args = parser.parse_args()
 
-    raw_data = load_latest_data()
-
-    if args.mode in ['standard', 'all']:
-        run_standard_pipeline(raw_data)
-    
-    if args.mode in ['ltc', 'all']:
-        run_ltc_pipeline(raw_data)
\ No newline at end of file
+    if args.chunked or config.PROCESS_CHUNKED:
+        latest_file = latest_data_file()
+        print(f"Processing in chunks: {latest_file}")
+        run_chunked_pipelines(latest_file, args.mode)
+    else:
+        raw_data = load_latest_data()
+        run_pipelines(raw_data, args.mode)
\ No newline at end of file
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sqlite3
+import time
+from src import config
+
+class ProfileStore:
+    """
+    login -> full name store shared across runs and repos. Names are refreshed after
+    PROFILE_CACHE_TTL_DAYS, and concurrent lookups of the same login share one request.
+    """
+    def __init__(self, path=None, ttl_days=None):
+        self.path = path or config.PROFILE_CACHE_PATH
+        self.ttl = (ttl_days if ttl_days is not None else config.PROFILE_CACHE_TTL_DAYS) * 86400
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS profiles (login TEXT PRIMARY KEY, name TEXT, fetched_at REAL)")
+
+        # small enough to keep in memory: (name, fetched_at) per login
+        self.profiles = {login: (name, fetched_at) for login, name, fetched_at
+                         in self.conn.execute("SELECT login, name, fetched_at FROM profiles")}
+        self.in_flight = {}
+        self.unresolved = {}  # failed lookups, remembered for this run only
+        self.pending_writes = 0
+        self.stats = {'stored': 0, 'fetched': 0, 'coalesced': 0}
+        print(f"Profile Store: {len(self.profiles)} profiles at {self.path}")
+
+    def is_fresh(self, login):
+        entry = self.profiles.get(login)
+        return entry is not None and time.time() - entry[1] < self.ttl
+
+    async def get(self, login, fetch):
+        """
+        Returns the full name for `login`. `fetch` is an async callable returning
+        (found, name), only called if the stored name is missing or stale.
+        """
+        if self.is_fresh(login):
+            self.stats['stored'] += 1
+            return self.profiles[login][0]
+        if login in self.unresolved:
+            return self.unresolved[login]
+
+        # someone is already fetching this login: wait for their result
+        if login in self.in_flight:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(self.in_flight[login])
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[login] = future
+        try:
+            found, name = await fetch()
+            self.stats['fetched'] += 1
+            if found:
+                self.remember(login, name)
+            else:
+                # lookup failed: keep serving the stale name rather than losing it
+                name = self.profiles[login][0] if login in self.profiles else None
+                self.unresolved[login] = name
+            future.set_result(name)
+            return name
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # nobody else may be waiting; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[login]
+
+    def remember(self, login, name):
+        """Stores a name learned elsewhere (e.g. from a GraphQL author field)."""
+        now = time.time()
+        self.profiles[login] = (name, now)
+        self.conn.execute("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?)", (login, name, now))
+        self.pending_writes += 1
+        if self.pending_writes >= 200:
+            self.conn.commit()
+            self.pending_writes = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+        print(f"Profile Store: {self.stats['stored']} served from store, "
+              f"{self.stats['fetched']} fetched, {self.stats['coalesced']} coalesced.")
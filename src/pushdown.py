@@ -0,0 +1,89 @@
+import math
+import re
+import pandas as pd
+from src import config
+
+COMMENT_PAGE_SIZE = 30  # comments_url pages are GitHub's default size
+
+class ListingFilter:
+    """
+    Processor thresholds checked on the issue listing (config.PUSHDOWN_FILTERS), so threads that no
+    enabled pipeline could keep are never expanded. Only safe cuts are made:
+      - standard: last activity (updated_at) before the time cutoff, or fewer listed comments than
+        FILTER_MIN_COMMENTS_PER_CASE and no way in as an active user's case (old, bot-authored, or an
+        author short of FILTER_MIN_CASES_PER_USER once the whole listing has been counted)
+      - ltc: fewer listed comments than LTC_MIN_COMMENTS_QUALITY, and no activity after the newest
+        non-bot case of the listing (LTC windows end at the newest record, which must not move)
+    The listed count includes bot and out-of-window comments, so it is an upper bound.
+    Skipped threads still get their body record (from the listing alone) so that per-user case counts
+    and LTC windows see every case; the processor's output is unchanged for thresholds at least this strict.
+    """
+    def __init__(self, mode):
+        self.standard = mode in ['standard', 'all']
+        self.ltc = mode in ['ltc', 'all']
+        self.bots = re.compile('|'.join(config.FILTER_BOT_KEYWORDS), re.IGNORECASE)
+        self.cutoff = None
+        if config.FILTER_TIME_CUTOFF_MONTHS > 0:
+            self.cutoff = pd.Timestamp.now(tz='UTC') - pd.DateOffset(months=config.FILTER_TIME_CUTOFF_MONTHS)
+
+        self.case_counts = {}  # author id -> in-time cases by non-bot authors in the listing
+        self.newest_case = None  # created_at of the newest case by a non-bot author
+        self.deferred = []
+        self.stats = {'listed': 0, 'skipped': 0, 'requests_saved': 0}
+
+    def in_time(self, timestamp):
+        return self.cutoff is None or pd.Timestamp(timestamp) >= self.cutoff
+
+    def active_path(self, issue):
+        """Whether the thread could be kept as an in-time case of an active (non-bot) author."""
+        return self.in_time(issue['created_at']) and not self.bots.search(issue['user']['login'])
+
+    def standard_candidate(self, issue):
+        """Whether the standard pipeline could keep the thread once its author's case count is known."""
+        return self.standard and self.in_time(issue['updated_at']) and self.active_path(issue)
+
+    def classify(self, issue):
+        """'expand', 'defer' (depends on the whole listing, see release) or 'skip'."""
+        self.stats['listed'] += 1
+        if self.active_path(issue):
+            author = issue['user']['id']
+            self.case_counts[author] = self.case_counts.get(author, 0) + 1
+        if not self.bots.search(issue['user']['login']):
+            created = pd.Timestamp(issue['created_at'])
+            if self.newest_case is None or created > self.newest_case: self.newest_case = created
+
+        comments = issue['comments']
+        if self.ltc and comments > 0 and comments >= config.LTC_MIN_COMMENTS_QUALITY:
+            return 'expand'
+        if self.standard and self.in_time(issue['updated_at']):
+            if comments > 0 and comments >= config.FILTER_MIN_COMMENTS_PER_CASE:
+                return 'expand'
+        # with ltc, a skipped thread's comments must not hold the newest activity
+        if self.standard_candidate(issue) or (self.ltc and comments > 0):
+            self.deferred.append(issue)
+            return 'defer'
+        return 'skip'
+
+    def release(self):
+        """After the whole listing: (deferred threads to expand, deferred threads to skip)."""
+        expand, skip = [], []
+        for issue in self.deferred:
+            active = self.case_counts.get(issue['user']['id'], 0) >= max(config.FILTER_MIN_CASES_PER_USER, 1)
+            newest = self.ltc and issue['comments'] > 0 and (
+                self.newest_case is None or pd.Timestamp(issue['updated_at']) > self.newest_case)
+            (expand if (active and self.standard_candidate(issue)) or newest else skip).append(issue)
+        self.deferred = []
+        return expand, skip
+
+    def skipped(self, issue, bulk_comments=False):
+        """Counts the requests expanding the thread would have taken (profile lookups not included)."""
+        self.stats['skipped'] += 1
+        requests = 2 if 'pull_request' in issue else 0  # PR details + first page of reviews
+        if issue['comments'] > 0 and not bulk_comments:
+            requests += math.ceil(issue['comments'] / COMMENT_PAGE_SIZE)
+        self.stats['requests_saved'] += requests
+
+    def report(self, full_name):
+        s = self.stats
+        print(f"[PUSHDOWN] {full_name}: expanded {s['listed'] - s['skipped']}/{s['listed']} listed threads, skipped {s['skipped']} "
+              f"(at least {s['requests_saved']} requests saved, plus their commenters' profile lookups).")
@@ -0,0 +1,105 @@
+import sys
+import pyarrow as pa
+
+# column order of the scraper's interaction records
+COLUMNS = [
+    'record_id', 'thread_id', 'parent_id', 'repo', 'type', 'author_id', 'author_username',
+    'title', 'text_content', 'created_at', 'url', 'commits', 'changed_files', 'additions', 'deletions',
+    'workspace_name', 'workspace_title', 'context_type', 'author_full_name', 'author_email_fake',
+    'collaborators_fake'
+]
+PR_STATS = ['commits', 'changed_files', 'additions', 'deletions']
+# columns holding a handful of distinct values, built as dictionary arrays (pandas categoricals)
+DICTIONARY_COLUMNS = ['repo', 'type', 'workspace_name', 'workspace_title', 'context_type']
+# arrow types of the other columns; nullable numbers are float so every batch serialises them the same way,
+# and created_at stays the API's ISO string
+TYPES = {
+    'record_id': pa.int64(), 'thread_id': pa.int64(), 'parent_id': pa.float64(), 'author_id': pa.int64(),
+    **{k: pa.float64() for k in PR_STATS}
+}
+
+class ThreadRecords:
+    """
+    The interaction records of one thread, kept as columns instead of one ~20-key dict per record.
+    Record 0 is the thread's body, the others are its comments. Values shared by the thread (repo,
+    workspace, context type, email domain, PR stats, collaborators) are stored once and only repeated
+    when a batch is converted by to_arrow; usernames and names are interned.
+    """
+    __slots__ = ('thread_id', 'repo', 'workspace_name', 'workspace_title', 'email_domain', 'body_type',
+                 'context_type', 'title', 'pr_stats', 'collaborators',
+                 'record_id', 'author_id', 'author_username', 'text_content', 'created_at', 'url', 'author_full_name')
+
+    def __init__(self, thread_id, repo, workspace_name, workspace_title, email_domain, body_type, context_type,
+                 title, pr_stats):
+        self.thread_id = thread_id
+        self.repo = repo
+        self.workspace_name = workspace_name
+        self.workspace_title = workspace_title
+        self.email_domain = email_domain
+        self.body_type = body_type
+        self.context_type = context_type
+        self.title = title
+        self.pr_stats = tuple(pr_stats[k] for k in PR_STATS)
+        self.collaborators = ""
+
+        self.record_id = []
+        self.author_id = []
+        self.author_username = []
+        self.text_content = []
+        self.created_at = []
+        self.url = []
+        self.author_full_name = []
+
+    def add(self, record_id, author_id, author_username, text_content, created_at, url, author_full_name):
+        """Appends a record (the body first, then the comments)."""
+        self.record_id.append(record_id)
+        self.author_id.append(author_id)
+        self.author_username.append(sys.intern(author_username))
+        self.text_content.append(text_content)
+        self.created_at.append(created_at)
+        self.url.append(url)
+        self.author_full_name.append(sys.intern(author_full_name) if author_full_name else author_full_name)
+
+    def __len__(self):
+        return len(self.record_id)
+
+    def columns(self):
+        """name -> list of values, for every column in COLUMNS."""
+        n = len(self)
+        comments = n - 1
+        return {
+            'record_id': self.record_id, 'thread_id': [self.thread_id] * n,
+            'parent_id': [None] + [self.record_id[0]] * comments,
+            'repo': [self.repo] * n, 'type': [self.body_type] + ['comment'] * comments,
+            'author_id': self.author_id, 'author_username': self.author_username,
+            'title': [self.title] + [None] * comments, 'text_content': self.text_content,
+            'created_at': self.created_at, 'url': self.url,
+            **{k: [v] + [None] * comments for k, v in zip(PR_STATS, self.pr_stats)},
+            'workspace_name': [self.workspace_name] * n, 'workspace_title': [self.workspace_title] * n,
+            'context_type': [self.context_type] + [None] * comments,
+            'author_full_name': self.author_full_name,
+            'author_email_fake': [f"{u}@{self.email_domain}" for u in self.author_username],
+            'collaborators_fake': [self.collaborators] + [""] * comments
+        }
+
+def dictionary_array(values):
+    """Dictionary-encoded string array of a low-cardinality list (None stays null)."""
+    codes = {}
+    indices = [None if v is None else codes.setdefault(v, len(codes)) for v in values]
+    return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(list(codes), pa.string()))
+
+def to_arrow(threads):
+    """One Arrow table (COLUMNS order) of a batch of ThreadRecords."""
+    batch = [t.columns() for t in threads if len(t)]
+    arrays = []
+    for name in COLUMNS:
+        values = [v for columns in batch for v in columns[name]]
+        if name in DICTIONARY_COLUMNS:
+            arrays.append(dictionary_array(values))
+        else:
+            arrays.append(pa.array(values, TYPES.get(name, pa.string())))
+    return pa.Table.from_arrays(arrays, names=COLUMNS)
+
+def to_frame(threads):
+    """to_arrow as pandas; numeric columns without nulls are handed over without a copy."""
+    return to_arrow(threads).to_pandas()
@@ -1,38 +1,76 @@
 import asyncio
 import aiohttp
-import pandas as pd
+import contextlib
+import heapq
+import json
 import os
+import random
 import time
 import datetime
 import traceback
 from tqdm.asyncio import tqdm
+from yarl import URL
 from dotenv import load_dotenv
+try:
+    import orjson  # optional, decodes responses several times faster
+except ImportError:
+    orjson = None
 from src import config
+from src.http_cache import ResponseCache
+from src.metrics import LatencyHistogram
+from src.profiles import ProfileStore
+from src.pushdown import ListingFilter
+from src.records import ThreadRecords
+from src.state import WatermarkStore
+from src import storage
+from src.writer import ShardedWriter
 
 # environment variables from .env file
 load_dotenv()
 
-# global buffer
-GLOBAL_RESULTS_BUFFER = []
-user_profile_cache = {}
-repo_details_cache = {}
+# shared across every repo in a run
+http_cache = None
+profile_store = None
+active_targets = []  # repos currently being scraped (flushed on rate-limit pauses)
+request_latency = LatencyHistogram()
+request_limiter = None  # bounds in-flight HTTP requests across all threads and repos
+decode_stats = {'bytes': 0, 'seconds': 0.0}  # JSON decoding + projection of responses
+
+# fields kept from each endpoint's objects (nested dicts project nested objects, None keeps the value).
+# Applied as each response is decoded, so reactions, labels, user blobs and URLs are never held.
+USER_FIELDS = {'login': None, 'id': None}
+ISSUE_FIELDS = {'id': None, 'number': None, 'user': USER_FIELDS, 'title': None, 'body': None,
+                'created_at': None, 'updated_at': None, 'html_url': None, 'comments': None,
+                'comments_url': None, 'pull_request': {'url': None}}
+COMMENT_FIELDS = {'id': None, 'user': USER_FIELDS, 'body': None, 'created_at': None, 'html_url': None, 'issue_url': None}
+PULL_FIELDS = {'commits': None, 'changed_files': None, 'additions': None, 'deletions': None}
+REVIEW_FIELDS = {'user': USER_FIELDS}
+PROFILE_FIELDS = {'name': None}
+REPO_FIELDS = {'description': None}
 
 # ensure output directory exists
 os.makedirs(config.OUTPUT_DIR, exist_ok=True)
 
 class SmartTokenManager:
-    """Manages multiple GitHub tokens to handle rate limits automatically."""
+    """
+    Schedules requests across all GitHub tokens. Every response updates the token's
+    X-RateLimit budget, requests go to the token with the most budget left, and each
+    token is paced by a small token bucket so secondary rate limits aren't tripped.
+    """
     def __init__(self):
         self.token_data = []
-        self.current_index = 0
         self.lock = asyncio.Lock()
+        self.paused_until = 0
+        self.stalls = {'count': 0, 'seconds': 0.0}  # wall-clock periods with every token exhausted or blocked (Retry-After)
+        self.pacing = {'count': 0, 'seconds': 0.0}  # wall-clock periods with requests only held back by the pacing buckets
+        self.waiting = None  # (counter, started) of the current period, if requests are waiting
 
         # load token(s)
         i = 1
         while True:
             t = os.getenv(f'GITHUB_TOKEN_{i}')
             if t:
-                self.token_data.append({'token': t, 'reset_at': 0})
+                self.token_data.append(self._new_token(t))
             else:
                 break
             i += 1
@@ -40,151 +78,501 @@ class SmartTokenManager:
         if not self.token_data:
             t = os.getenv('GITHUB_TOKEN')
             if t:
-                self.token_data.append({'token': t, 'reset_at': 0})
+                self.token_data.append(self._new_token(t))
 
         if not self.token_data:
             raise ValueError("No GitHub tokens found in .env file!")
 
         print(f"Token Manager: Loaded {len(self.token_data)} tokens.")
 
-    def get_current_headers(self):
-        t_data = self.token_data[self.current_index]
+    @staticmethod
+    def _new_token(token):
         return {
-            'Authorization': f'token {t_data["token"]}',
+            'token': token,
+            'remaining': {},      # resource ('core', 'graphql') -> requests left in window
+            'reset_at': {},       # resource -> epoch when the window resets
+            'in_flight': {},      # resource -> requests sent but not answered yet
+            'blocked_until': 0,   # secondary rate limit / Retry-After backoff
+            'bucket': config.TOKEN_BURST,
+            'bucket_at': time.time()
+        }
+
+    def get_headers(self, index):
+        return {
+            'Authorization': f'token {self.token_data[index]["token"]}',
             'Accept': 'application/vnd.github.v3+json'
         }
 
-    async def report_403_and_rotate(self, failed_index, github_reset_header):
-        async with self.lock:
-            current_time = time.time()
-            # update reset time for failed token
-            self.token_data[failed_index]['reset_at'] = int(github_reset_header) + 10
-
-            # if index changed while waiting, check if new token is valid
-            if self.current_index != failed_index:
-                if self.token_data[self.current_index]['reset_at'] <= current_time:
-                    return True, 0
-
-            # find next available token
-            for i, t_data in enumerate(self.token_data):
-                if t_data['reset_at'] <= current_time:
-                    self.current_index = i
-                    print(f"\n[!] Switching to valid Token #{i + 1}...")
-                    return True, 0
-
-            # all tokens exhausted
-            earliest_reset = min(t['reset_at'] for t in self.token_data)
-            wait_time = max(earliest_reset - current_time, 0)
-            print(f"\n[!] All tokens exhausted. Sleeping {wait_time/60:.1f} mins.")
-            return False, wait_time
+    def _available_at(self, t_data, resource, now):
+        """When the token may next be used for `resource` (ignoring pacing)."""
+        available = t_data['blocked_until']
+        remaining = t_data['remaining'].get(resource)
+        reset_at = t_data['reset_at'].get(resource, 0)
+        if remaining is not None and remaining <= config.TOKEN_RESERVE and reset_at > now:
+            available = max(available, reset_at + 1)
+        return available
+
+    def _end_wait(self, now):
+        if self.waiting is not None:
+            counter, started = self.waiting
+            counter['seconds'] += now - started
+            self.waiting = None
+
+    async def acquire(self, resource='core'):
+        """Waits for a request slot. Returns (token_index, headers)."""
+        rate = config.TOKEN_REQUESTS_PER_MINUTE / 60
+        while True:
+            async with self.lock:
+                now = time.time()
+                best_index, best_key, wait = None, None, None
+                paced = False  # some token only lacks a pacing slot
+
+                for i, t_data in enumerate(self.token_data):
+                    # refill the pacing bucket
+                    t_data['bucket'] = min(config.TOKEN_BURST, t_data['bucket'] + (now - t_data['bucket_at']) * rate)
+                    t_data['bucket_at'] = now
+
+                    available = self._available_at(t_data, resource, now)
+                    if available > now:
+                        wait = available - now if wait is None else min(wait, available - now)
+                        continue
+                    if t_data['bucket'] < 1:
+                        paced = True
+                        refill = (1 - t_data['bucket']) / rate
+                        wait = refill if wait is None else min(wait, refill)
+                        continue
+
+                    # unknown budget (no response yet, or window reset) counts as full
+                    budget = t_data['remaining'].get(resource)
+                    if budget is None or t_data['reset_at'].get(resource, 0) <= now:
+                        budget = float('inf')
+                    # most budget first; ties go to the least recently used bucket
+                    key = (budget, t_data['bucket'])
+                    if best_key is None or key > best_key:
+                        best_index, best_key = i, key
+
+                if best_index is not None:
+                    # a token freed up: the wait (if any) ends, however many requests waited through it
+                    self._end_wait(now)
+                    t_data = self.token_data[best_index]
+                    t_data['bucket'] -= 1
+                    t_data['in_flight'][resource] = t_data['in_flight'].get(resource, 0) + 1
+                    if resource in t_data['remaining']: t_data['remaining'][resource] -= 1
+                    return best_index, self.get_headers(best_index)
+
+                # pacing gaps are the scheduler working as intended, not a lack of budget
+                counter = self.pacing if paced else self.stalls
+                if self.waiting is None or self.waiting[0] is not counter:
+                    self._end_wait(now)
+                    self.waiting = (counter, now)
+                    counter['count'] += 1
+
+                # every token is exhausted or blocked for longer than a pacing gap
+                long_pause = wait > 60 and self.paused_until <= now
+                if long_pause: self.paused_until = now + wait
+
+            if long_pause:
+                print(f"\n[!] All tokens exhausted. Sleeping {wait/60:.1f} mins.")
+                save_checkpoint("RATE_LIMIT_PAUSE")
+            await asyncio.sleep(wait)
+
+    def update(self, index, headers, resource='core', status=None):
+        """Settles a request from acquire with the rate-limit headers GitHub sends with every response."""
+        t_data = self.token_data[index]
+        self.release(index, resource)
+        # revalidations answered 304 don't count against the rate limit
+        if status == 304 and resource in t_data['remaining']: t_data['remaining'][resource] += 1
+
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_at = headers.get('X-RateLimit-Reset')
+        if remaining is None or reset_at is None: return
+
+        resource = headers.get('X-RateLimit-Resource', resource)
+        # the server's count doesn't include requests still in flight, which were charged locally
+        t_data['remaining'][resource] = max(0, int(remaining) - t_data['in_flight'].get(resource, 0))
+        t_data['reset_at'][resource] = int(reset_at)
+
+    def release(self, index, resource='core'):
+        """Marks a request from acquire as finished. Without a response its charge stays, it may have counted."""
+        in_flight = self.token_data[index]['in_flight']
+        in_flight[resource] = max(0, in_flight.get(resource, 0) - 1)
+
+    def report_rate_limit(self, index, headers, body=""):
+        """Handles a 403/429. Returns True if it was a rate limit and the request should be retried."""
+        t_data = self.token_data[index]
+        retry_after = headers.get('Retry-After')
+        if retry_after is not None:
+            t_data['blocked_until'] = time.time() + int(retry_after)
+            print(f"\n[!] Token #{index + 1} hit a secondary rate limit. Backing off {retry_after}s.")
+            return True
+        if headers.get('X-RateLimit-Remaining') == '0':
+            # update() already marked the budget as spent until reset
+            return True
+        if 'secondary rate limit' in body.lower():
+            # no Retry-After given: GitHub asks for at least a minute
+            t_data['blocked_until'] = time.time() + 60
+            print(f"\n[!] Token #{index + 1} hit a secondary rate limit. Backing off 60s.")
+            return True
+        return False
 
 token_manager = SmartTokenManager()
 
-def save_checkpoint(reason="CHECKPOINT"):
-    if not GLOBAL_RESULTS_BUFFER: return
-
-    print(f"\n[SAVE] Saving {reason}...")
-    try:
-        df = pd.DataFrame(GLOBAL_RESULTS_BUFFER)
-        if 'created_at' in df.columns:
-            df['created_at'] = pd.to_datetime(df['created_at'])
-            df.sort_values(by=['created_at', 'record_id'], ascending=[False, True], inplace=True)
-
-        filename = os.path.join(config.OUTPUT_DIR, f'github_{config.OWNER}_{config.REPO}_{reason}.csv')
-        df.to_csv(filename, index=False)
-    except Exception as e:
-        print(f"[ERROR] Save failed: {e}")
+class RepoTarget:
+    """One repository in a scrape: its identity, output folder and per-run state."""
+    def __init__(self, owner, repo, output_dir=None):
+        self.owner = owner
+        self.repo = repo
+        self.output_dir = output_dir or config.OUTPUT_DIR
+        self.description = None
+        self.writer = None            # streaming output (completed threads go straight to disk shards)
+        self.watermark_store = None   # set in incremental mode
+        self.total_threads = 0        # threads queued for expansion (set by the fetch backend)
+        self.stream = None            # streaming.ThreadStream fed with completed threads (pipeline --stream)
+        self.final_file = None        # the _FINAL file for the process stage, once written
+        self.comment_sources = {'harvested': 0, 'thread': 0}  # where threads with comments got them from
+        self.listing_complete = True  # False if a listing page or a thread failed (the watermark must not advance then)
+
+    @property
+    def full_name(self):
+        return f"{self.owner}/{self.repo}"
+
+    def checkpoint_path(self, reason):
+        return os.path.join(self.output_dir, f'github_{self.owner}_{self.repo}_{reason}.csv')
+
+    def save_checkpoint(self, reason="CHECKPOINT"):
+        """Flushes buffered rows to a shard and persists watermarks. Costs O(batch), not O(total)."""
+        if self.writer is None: return
+
+        print(f"\n[SAVE] Saving {self.full_name} {reason}...")
+        try:
+            self.writer.flush()
+            # watermarks are only persisted once the rows they describe are on disk
+            if self.watermark_store: self.watermark_store.save()
+            if reason == "CRASH_DUMP":
+                self.writer.compact(self.checkpoint_path(reason))
+        except Exception as e:
+            print(f"[ERROR] Save failed: {e}")
 
-async def fetch_json(session, url, retries=3):
+def save_checkpoint(reason="CHECKPOINT"):
+    for target in active_targets:
+        target.save_checkpoint(reason)
+
+def project(item, fields):
+    """The `fields` (see ISSUE_FIELDS) of a decoded JSON object; anything that isn't an object is kept as is."""
+    if not isinstance(item, dict): return item
+    return {name: item[name] if sub is None else project(item[name], sub) for name, sub in fields.items() if name in item}
+
+def decode(body, fields=None):
+    """Parses a response body (with orjson if installed), keeping only `fields` of the object or of each list item."""
+    start = time.perf_counter()
+    data = orjson.loads(body) if orjson else json.loads(body)
+    if fields is not None:
+        data = [project(item, fields) for item in data] if isinstance(data, list) else project(data, fields)
+    decode_stats['bytes'] += len(body)
+    decode_stats['seconds'] += time.perf_counter() - start
+    return data
+
+async def fetch_json(session, url, retries=3, payload=None, fields=None):
+    """
+    GETs a URL (or POSTs `payload` as JSON, e.g. for GraphQL) through the token scheduler, with retries.
+    `fields` projects the decoded data (see ISSUE_FIELDS); the cache keeps the full body.
+    """
     if not url: return None, None
+    resource = 'graphql' if payload is not None else 'core'
+    cached = http_cache.get(url) if http_cache and payload is None else None
 
-    for attempt in range(retries):
+    attempt = 0
+    while attempt < retries:
         try:
-            attempt_index = token_manager.current_index
-            headers = token_manager.get_current_headers()
-
-            async with session.get(url, headers=headers) as response:
-                if response.status == 403:
-                    limit_remaining = response.headers.get('X-RateLimit-Remaining')
-                    if limit_remaining == '0':
-                        reset_header = response.headers.get('X-RateLimit-Reset', 0)
-                        should_retry, wait_time = await token_manager.report_403_and_rotate(attempt_index, reset_header)
-                        
-                        if should_retry: continue
-                        
-                        async with token_manager.lock:
-                            current_time = time.time()
-                            earliest = min(t['reset_at'] for t in token_manager.token_data)
-                            real_wait = max(earliest - current_time, 0)
-                            if real_wait > 0:
-                                save_checkpoint("RATE_LIMIT_PAUSE")
-                                await asyncio.sleep(real_wait)
-                            continue
-
-                if response.status == 200:
-                    return await response.json(), response.links
-                if response.status == 404:
-                    return None, None
+            # only the request itself holds a slot, not retry backoff
+            async with request_limiter or contextlib.nullcontext():
+                token_index, headers = await token_manager.acquire(resource)
+                if cached: headers.update(http_cache.conditional_headers(cached))
+
+                if payload is not None:
+                    request = session.post(url, json=payload, headers=headers)
+                else:
+                    request = session.get(url, headers=headers)
+
+                start, status = time.monotonic(), 'error'
+                try:
+                    async with request as response:
+                        status = response.status
+                        token_manager.update(token_index, response.headers, resource, status)
+
+                        if response.status in (403, 429):
+                            body = await response.text()
+                            # rate limits don't count as failed attempts, the scheduler waits them out
+                            if token_manager.report_rate_limit(token_index, response.headers, body): continue
+
+                        if response.status == 304 and cached:
+                            body, links = http_cache.revalidated(cached)
+                            return decode(body, fields), links
+                        if response.status == 200:
+                            body = await response.read()
+                            if http_cache and payload is None:
+                                http_cache.put(url, response.headers, body, response.links)
+                            return decode(body, fields), response.links
+                        if response.status == 404:
+                            return None, None
                 
-                response.raise_for_status()
+                        response.raise_for_status()
+                finally:
+                    request_latency.record(time.monotonic() - start, status)
+                    if status == 'error': token_manager.release(token_index, resource)
 
         except (aiohttp.ClientError, asyncio.TimeoutError):
-            if attempt == retries - 1: return None, None
-            await asyncio.sleep(2)
+            attempt += 1
+            if attempt == retries: return None, None
+            await asyncio.sleep(backoff_delay(attempt))
         except Exception as e:
             print(f"Error in fetch_json: {e}")
             return None, None
     return None, None
 
-async def fetch_paginated_async(session, start_url, max_pages=0, desc="Fetching", use_progress=False):
-    all_items = []
-    url = start_url
-    page_count = 0
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter, so retries from concurrent requests don't line up."""
+    return random.uniform(0, min(config.RETRY_BACKOFF_MAX, config.RETRY_BACKOFF_BASE * 2 ** (attempt - 1)))
+
+def page_url(url, number):
+    return str(URL(str(url)).update_query(page=number))
+
+def link_page_number(links, rel):
+    """Page number of a rel link (e.g. 'last'), or None if the response has no such link."""
+    if not links or rel not in links: return None
+    page = URL(str(links[rel]['url'])).query.get('page')
+    return int(page) if page else None
+
+async def iter_pages_async(session, start_url, max_pages=0, desc="Fetching", use_progress=False, fields=None, failed=None):
+    """
+    Yields (page_number, items) as pages arrive, each item projected to `fields`. The `last` link of the
+    first page gives the page range, and the remaining pages are fetched concurrently (bounded by `request_limiter`).
+    Pages that fail after fetch_json's retries are skipped; their numbers are appended to `failed` if given.
+    """
     pbar = tqdm(desc=f"{desc} (Pages)", unit="page", leave=False) if use_progress else None
 
+    async def fetch_page(number, url):
+        data, links = await fetch_json(session, url, fields=fields)
+        if pbar is not None: pbar.update(1)
+        if data is None and failed is not None: failed.append(number)
+        return number, data, links
+
+    tasks = []
     try:
-        while url:
-            if max_pages != 0 and page_count >= max_pages: break
-            data, links = await fetch_json(session, url)
-            if not data: break
-            
-            all_items.extend(data)
-            
-            if 'next' in links:
-                url = links['next']['url']
-                page_count += 1
-                if pbar: pbar.update(1)
-            else:
-                break
+        number, data, links = await fetch_page(1, start_url)
+        if not data: return
+        yield number, data
+
+        last_page = link_page_number(links, 'last')
+        if last_page:
+            if max_pages != 0: last_page = min(last_page, max_pages)
+            if pbar is not None: pbar.total = last_page
+
+            tasks = [asyncio.create_task(fetch_page(n, page_url(start_url, n))) for n in range(2, last_page + 1)]
+            for f in asyncio.as_completed(tasks):
+                number, data, _ = await f
+                if data: yield number, data
+        else:
+            # no page range advertised: follow `next` links one at a time
+            while links and 'next' in links and (max_pages == 0 or number < max_pages):
+                number, data, links = await fetch_page(number + 1, links['next']['url'])
+                if not data: break
+                yield number, data
     finally:
-        if pbar: pbar.close()
-    return all_items
+        # closed or cancelled early: pages still in flight would keep using rate limit and request slots
+        for task in tasks:
+            task.cancel()
+        if pbar is not None: pbar.close()
+
+async def fetch_paginated_async(session, start_url, max_pages=0, desc="Fetching", use_progress=False, fields=None):
+    pages = [page async for page in iter_pages_async(session, start_url, max_pages, desc, use_progress, fields)]
+    pages.sort(key=lambda page: page[0])
+    return [item for _, items in pages for item in items]
 
 async def get_user_full_name_async(session, username):
     if not username: return None
-    if username in user_profile_cache: return user_profile_cache[username]
-    data, _ = await fetch_json(session, f"https://api.github.com/users/{username}")
-    full_name = data.get('name') if data else None
-    user_profile_cache[username] = full_name
-    return full_name
 
-async def process_thread(session, issue, semaphore):
+    async def fetch():
+        data, _ = await fetch_json(session, f"{config.GITHUB_API_URL}/users/{username}", fields=PROFILE_FIELDS)
+        return data is not None, data.get('name') if data else None
+
+    return await profile_store.get(username, fetch)
+
+def build_interactions(target, issue, author_full_name, pr_stats, reviews, comments_data, comment_names):
+    """Turns one REST-shaped thread (issue, PR stats, reviews, comments) of `target` into its ThreadRecords."""
+    is_pr = 'pull_request' in issue
+    collaborators_set = {issue['user']['login']}
+
+    for review in reviews:
+        if review.get('user'): collaborators_set.add(review['user']['login'])
+
+    interactions = ThreadRecords(
+        thread_id=issue['number'], repo=target.full_name,
+        workspace_name=target.owner, workspace_title=target.description, email_domain=f"{target.repo}.com",
+        body_type='pull_request_body' if is_pr else 'issue_body',
+        context_type='GITHUB_PR' if is_pr else 'GITHUB_ISSUE',
+        title=issue.get('title'), pr_stats=pr_stats
+    )
+
+    # main record
+    interactions.add(issue['id'], issue['user']['id'], issue['user']['login'], issue.get('body'),
+                     issue['created_at'], issue['html_url'], author_full_name)
+
+    # comment records
+    for i, comment in enumerate(comments_data):
+        if not comment.get('user'): continue
+        username = comment['user']['login']
+        if is_pr: collaborators_set.add(username)
+        interactions.add(comment['id'], comment['user']['id'], username, comment.get('body'),
+                         comment['created_at'], comment['html_url'], comment_names[i])
+
+    interactions.collaborators = ",".join(sorted(list(collaborators_set)))
+    return interactions
+
+def listing_interactions(target, issue):
+    """A thread's body record from its listing entry alone (no comments, reviews, PR stats or name)."""
+    pr_stats = {'commits': None, 'changed_files': None, 'additions': None, 'deletions': None}
+    return build_interactions(target, issue, None, pr_stats, [], [], [])
+
+class CommentHarvest:
+    """
+    Every conversation comment of the repo from the repo-level /issues/comments listing (oldest first,
+    100 per page, pages fetched concurrently), grouped by thread number via issue_url and handed out as
+    pages arrive: a thread's claim returns once every page up to its last listed activity (updated_at)
+    is in, so none of its older comments can still be missing. Comments of threads that are done or
+    skipped are dropped on arrival. Past HARVEST_BUFFER_COMMENTS held comments, the threads holding the
+    most are dropped and fetch their own comments_url, as do threads a failed page left short (fewer
+    comments up to their updated_at than the listing counted).
+    """
+    def __init__(self, session, target):
+        self.target = target
+        self.buffers = {}       # thread number -> comments so far
+        self.waiters = {}       # thread number -> future resolved when its comments are complete
+        self.pending = []       # heap of (updated_at, thread number) of the waiters
+        self.closed = set()     # threads claimed, skipped or dropped: their comments are not kept
+        self.page_last = {}     # page number -> newest created_at on it, until the pages before it are in
+        self.next_page = 1
+        self.frontier = None    # every comment created before this has arrived
+        self.finished = False
+        self.stats = {'comments': 0, 'buffered': 0, 'peak': 0, 'dropped': 0}
+        self.task = asyncio.create_task(self.run(session))
+
+    async def run(self, session):
+        target = self.target
+        url = (f'{config.GITHUB_API_URL}/repos/{target.owner}/{target.repo}/issues/comments'
+               f'?sort=created&direction=asc&per_page=100')
+        if target.watermark_store and target.watermark_store.since:
+            # a changed thread's older comments are missing then, so it falls back to its comments_url
+            url += f'&since={target.watermark_store.since}'
+
+        try:
+            async for number, page in iter_pages_async(session, url, desc=f"Comments {target.full_name}",
+                                                       use_progress=True, fields=COMMENT_FIELDS):
+                for comment in page:
+                    self.add(int(comment['issue_url'].rsplit('/', 1)[1]), comment)
+                self.stats['comments'] += len(page)
+                self.advance(number, max(c['created_at'] for c in page))
+        except Exception as e:
+            print(f"[WARN] Comment harvest for {target.full_name} stopped early: {e}")
+        finally:
+            # claims decide between the harvest and their own comments_url now
+            self.finished = True
+            for future in self.waiters.values():
+                if not future.done(): future.set_result(None)
+            self.waiters, self.pending = {}, []
+        print(f"\n{target.full_name}: Harvested {self.stats['comments']} comments (at most {self.stats['peak']} held at once, "
+              f"{self.stats['dropped']} threads left to fetch their own).")
+
+    def add(self, number, comment):
+        if number in self.closed: return
+        self.buffers.setdefault(number, []).append(comment)
+        self.stats['buffered'] += 1
+        self.stats['peak'] = max(self.stats['peak'], self.stats['buffered'])
+        if self.stats['buffered'] > config.HARVEST_BUFFER_COMMENTS:
+            self.shed()
+
+    def advance(self, number, newest):
+        """Moves the frontier over the pages that are in without gaps, releasing the threads it passed."""
+        self.page_last[number] = newest
+        while self.next_page in self.page_last:
+            last = self.page_last.pop(self.next_page)
+            self.next_page += 1
+            if self.frontier is None or last > self.frontier: self.frontier = last
+        while self.pending and self.passed(self.pending[0][0]):
+            future = self.waiters.pop(heapq.heappop(self.pending)[1], None)
+            if future and not future.done(): future.set_result(None)
+
+    def passed(self, updated_at):
+        # strictly after: the next page may still hold comments from the same second
+        return self.frontier is not None and self.frontier > updated_at
+
+    def shed(self):
+        """Drops the largest buffers until half the limit is held."""
+        for number in sorted(self.buffers, key=lambda n: len(self.buffers[n]), reverse=True):
+            if self.stats['buffered'] <= config.HARVEST_BUFFER_COMMENTS // 2: break
+            self.discard(number)
+            self.stats['dropped'] += 1
+            future = self.waiters.pop(number, None)
+            if future and not future.done(): future.set_result(None)
+
+    def discard(self, number):
+        """Stops collecting a thread's comments (e.g. a thread the pushdown skips)."""
+        self.closed.add(number)
+        self.stats['buffered'] -= len(self.buffers.pop(number, []))
+
+    async def claim(self, issue):
+        """The thread's comments once the harvest is past its last activity, or None if it has to fetch them itself."""
+        number = issue['number']
+        if number in self.closed: return None
+        if not self.finished and not self.passed(issue['updated_at']):
+            future = asyncio.get_running_loop().create_future()
+            self.waiters[number] = future
+            heapq.heappush(self.pending, (issue['updated_at'], number))
+            await future
+        if number in self.closed: return None  # dropped while waiting
+
+        comments = self.buffers.get(number, [])
+        self.discard(number)
+        # comments posted after the listing must not make up for older ones a failed page lost
+        listed = sum(c['created_at'] <= issue['updated_at'] for c in comments)
+        return comments if listed >= issue['comments'] else None
+
+    def cancel(self):
+        """Stops a harvest still running (returns False if it had finished)."""
+        if self.task.done(): return False
+        self.task.cancel()
+        return True
+
+async def thread_comments(session, target, issue, harvested=None):
+    """A thread's comments: the harvested ones if the harvest had all of them, else from its comments_url."""
+    if harvested is not None:
+        target.comment_sources['harvested'] += 1
+        # the per-thread listing's order (ascending id)
+        return sorted(harvested, key=lambda c: c['id'])
+    target.comment_sources['thread'] += 1
+    return await fetch_paginated_async(session, issue['comments_url'], use_progress=False, fields=COMMENT_FIELDS)
+
+async def process_thread(session, target, issue, thread_limiter, harvest=None):
     try:
-        async with semaphore:
-            interactions = []
+        # waiting for harvested comments doesn't take one of the thread slots
+        harvested = await harvest.claim(issue) if harvest is not None and issue['comments'] > 0 else None
+
+        # bounds threads being expanded; their requests are bounded separately in fetch_json
+        async with thread_limiter:
             is_pr = 'pull_request' in issue
 
             # prepare async tasks
             tasks = [get_user_full_name_async(session, issue['user']['login'])]
             
             if is_pr:
-                tasks.append(fetch_json(session, issue['pull_request']['url']))
-                tasks.append(fetch_paginated_async(session, f"{issue['pull_request']['url']}/reviews", use_progress=False))
+                tasks.append(fetch_json(session, issue['pull_request']['url'], fields=PULL_FIELDS))
+                tasks.append(fetch_paginated_async(session, f"{issue['pull_request']['url']}/reviews", use_progress=False,
+                                                   fields=REVIEW_FIELDS))
             else:
                 tasks.extend([asyncio.sleep(0), asyncio.sleep(0)])
 
             if issue['comments'] > 0:
-                tasks.append(fetch_paginated_async(session, issue['comments_url'], use_progress=False))
+                tasks.append(thread_comments(session, target, issue, harvested))
             else:
                 tasks.append(asyncio.sleep(0))
 
@@ -193,105 +581,241 @@ async def process_thread(session, issue, semaphore):
             
             # PR stats
             pr_stats = {'commits': None, 'changed_files': None, 'additions': None, 'deletions': None}
-            collaborators_set = {issue['user']['login']}
 
             if is_pr and results[1] and results[1][0]:
                 data = results[1][0]
                 for k in pr_stats.keys(): pr_stats[k] = data.get(k)
 
-            if is_pr and isinstance(results[2], list):
-                for review in results[2]:
-                    if review.get('user'): collaborators_set.add(review['user']['login'])
-
+            reviews = results[2] if is_pr and isinstance(results[2], list) else []
             comments_data = results[3] if isinstance(results[3], list) else []
 
-            # create main record
-            interactions.append({
-                'record_id': issue['id'], 'thread_id': issue['number'], 'parent_id': None,
-                'repo': f"{config.OWNER}/{config.REPO}",
-                'type': 'pull_request_body' if is_pr else 'issue_body',
-                'author_id': issue['user']['id'], 'author_username': issue['user']['login'],
-                'title': issue.get('title'), 'text_content': issue.get('body'),
-                'created_at': issue['created_at'], 'url': issue['html_url'],
-                **pr_stats,
-                'workspace_name': config.OWNER,
-                'workspace_title': repo_details_cache.get('desc'),
-                'context_type': 'GITHUB_PR' if is_pr else 'GITHUB_ISSUE',
-                'author_full_name': author_full_name,
-                'author_email_fake': f"{issue['user']['login']}@{config.REPO}.com",
-                'collaborators_fake': ""
-            })
-
             # fetch comment author names in parallel
             comment_name_tasks = [get_user_full_name_async(session, c['user']['login']) if c.get('user') else asyncio.sleep(0) for c in comments_data]
             comment_names = await asyncio.gather(*comment_name_tasks)
 
-            # create comment records
-            for i, comment in enumerate(comments_data):
-                if not comment.get('user'): continue
-                username = comment['user']['login']
-                if is_pr: collaborators_set.add(username)
-
-                interactions.append({
-                    'record_id': comment['id'], 'thread_id': issue['number'], 'parent_id': issue['id'],
-                    'repo': f"{config.OWNER}/{config.REPO}", 'type': 'comment',
-                    'author_id': comment['user']['id'], 'author_username': username,
-                    'title': None, 'text_content': comment.get('body'), 'created_at': comment['created_at'],
-                    'url': comment['html_url'],
-                    'workspace_name': config.OWNER, 'workspace_title': repo_details_cache.get('desc'),
-                    'context_type': None,
-                    'author_full_name': comment_names[i],
-                    'author_email_fake': f"{username}@{config.REPO}.com",
-                    'collaborators_fake': ""
-                })
-
-            interactions[0]['collaborators_fake'] = ",".join(sorted(list(collaborators_set)))
-            return interactions
+            return build_interactions(target, issue, author_full_name, pr_stats, reviews, comments_data, comment_names)
     except Exception as e:
-        print(f"Error thread {issue['number']}: {e}")
+        print(f"Error thread {target.full_name}#{issue['number']}: {e}")
         return []
 
-async def main():
-    print(f"Targeting: {config.OWNER}/{config.REPO}")
-    print(f"Saving to: {config.OUTPUT_DIR}")
+async def iter_rest_threads(session, target, thread_limiter):
+    """
+    Lists threads over REST and expands each one with process_thread. Yields (issue, interactions).
+    Threads start expanding as soon as their listing page arrives.
+    """
+    watermark_store = target.watermark_store
+    issues_url = f'{config.GITHUB_API_URL}/repos/{target.owner}/{target.repo}/issues?state=all&per_page=100'
+    if watermark_store and watermark_store.since:
+        issues_url += f'&since={watermark_store.since}'
+
+    results = asyncio.Queue()
+    tasks = set()
+    listing_done = object()
+
+    # one repo-wide comment listing instead of a comments_url fan-out per thread
+    # (only when the whole repo is listed, otherwise it would fetch comments of unlisted threads)
+    harvest = None
+    if config.BULK_COMMENTS and config.MAX_ISSUE_PAGES == 0:
+        harvest = CommentHarvest(session, target)
+
+    # opt-in: threads no enabled pipeline could keep are not expanded
+    # (not in incremental runs, whose listing lacks the unchanged threads the case counts need)
+    listing_filter = None
+    if config.PUSHDOWN_FILTERS and not watermark_store:
+        listing_filter = ListingFilter(config.PUSHDOWN_FILTERS)
+
+    def start(issue):
+        task = asyncio.create_task(expand(issue))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async def skip(issue):
+        listing_filter.skipped(issue, bulk_comments=harvest is not None)
+        if harvest is not None: harvest.discard(issue['number'])
+        await results.put((issue, listing_interactions(target, issue)))
+
+    async def expand(issue):
+        try:
+            result = await process_thread(session, target, issue, thread_limiter, harvest)
+        except Exception as e:
+            print(f"Task failed: {e}")
+            result = []
+        await results.put((issue, result))
 
-    timeout = aiohttp.ClientTimeout(total=None)
+    async def list_threads():
+        listed = queued = 0
+        failed_pages = []
+        try:
+            pages = iter_pages_async(session, issues_url, config.MAX_ISSUE_PAGES, desc=f"Listing {target.full_name}",
+                                     use_progress=True, fields=ISSUE_FIELDS, failed=failed_pages)
+            async for _, page in pages:
+                listed += len(page)
+                # skip threads whose watermark is unchanged (already scraped, or done before a crash)
+                if watermark_store:
+                    page = [issue for issue in page if not watermark_store.is_current(issue)]
+
+                queued += len(page)
+                target.total_threads += len(page)
+                if listing_filter:
+                    actions = [(issue, listing_filter.classify(issue)) for issue in page]
+                    for issue in [issue for issue, action in actions if action == 'skip']:
+                        await skip(issue)
+                    # the threads most likely to qualify are expanded first
+                    page = sorted([issue for issue, action in actions if action == 'expand'],
+                                  key=lambda issue: issue['comments'], reverse=True)
+                for issue in page:
+                    start(issue)
+        finally:
+            if failed_pages:
+                target.listing_complete = False
+                print(f"\n[WARN] {target.full_name}: {len(failed_pages)} listing pages failed (e.g. page {min(failed_pages)}).")
+            # deferred threads wait for their author's case count over the whole listing
+            if listing_filter:
+                expand_later, skip_later = listing_filter.release()
+                for issue in skip_later:
+                    await skip(issue)
+                for issue in expand_later:
+                    start(issue)
+            if watermark_store:
+                print(f"\n[INCREMENTAL] {target.full_name}: {queued}/{listed} listed threads changed since last run.")
+            print(f"\n{target.full_name}: Listed {queued} threads.")
+            await results.put((listing_done, queued))
+
+    print("\nListing and processing threads...")
+    lister = asyncio.create_task(list_threads())
+
+    received, expected = 0, None
     try:
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            # get repo details
-            repo_data, _ = await fetch_json(session, f"https://api.github.com/repos/{config.OWNER}/{config.REPO}")
-            repo_details_cache['desc'] = repo_data.get('description') if repo_data else None
-
-            # get issue list
-            issues_url = f'https://api.github.com/repos/{config.OWNER}/{config.REPO}/issues?state=all&per_page=100'
-            issues_list = await fetch_paginated_async(session, issues_url, config.MAX_ISSUE_PAGES, desc="Fetching List", use_progress=True)
-
-            print(f"\nProcessing {len(issues_list)} threads...")
-            semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_REQUESTS)
-            tasks = [process_thread(session, issue, semaphore) for issue in issues_list]
-
-            completed = 0
-            last_print = time.time()
+        while expected is None or received < expected:
+            issue, result = await results.get()
+            if issue is listing_done:
+                expected = result
+                continue
+            received += 1
+            yield issue, result
+    finally:
+        # e.g. no listed thread had comments to wait for, or the scrape crashed
+        if harvest is not None and harvest.cancel():
+            harvest = None
+
+    await lister
+    if listing_filter: listing_filter.report(target.full_name)
+    if harvest is not None:
+        print(f"{target.full_name}: Comments of {target.comment_sources['harvested']} threads from the harvest, "
+              f"{target.comment_sources['thread']} fetched per thread.")
+
+async def scrape_repo(session, target, thread_limiter):
+    """Scrapes one repository into `target.output_dir`. A crash here doesn't stop other repos."""
+    print(f"Targeting: {target.full_name}")
+    print(f"Saving to: {target.output_dir}")
+    os.makedirs(target.output_dir, exist_ok=True)
+
+    shard_dir = os.path.join(target.output_dir, 'shards')
+    if config.INCREMENTAL:
+        target.watermark_store = WatermarkStore(target.owner, target.repo)
+        started_at = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        # resume: keep writing into the shards of a run that crashed before finishing
+        pending = target.watermark_store.pending
+        if pending and pending['threads']:
+            shard_dir = pending['shard_dir']
+            print(f"[RESUME] Recovered {len(pending['threads'])} threads from {shard_dir}")
+        target.watermark_store.begin_run(started_at, os.path.abspath(shard_dir))
+
+    target.writer = ShardedWriter(shard_dir)
+    watermark_store = target.watermark_store
+    active_targets.append(target)
 
-            for f in asyncio.as_completed(tasks):
-                try:
-                    result = await f
-                    GLOBAL_RESULTS_BUFFER.extend(result)
-                    completed += 1
-                    
-                    if time.time() - last_print > 10:
-                        print(f"Progress: {completed}/{len(issues_list)} ({completed/len(issues_list)*100:.1f}%)")
-                        last_print = time.time()
-                except Exception as e:
-                    print(f"Task failed: {e}")
-
-            if GLOBAL_RESULTS_BUFFER: save_checkpoint("FINAL")
-            else: print("No data processed.")
+    try:
+        # get repo details
+        repo_data, _ = await fetch_json(session, f"{config.GITHUB_API_URL}/repos/{target.owner}/{target.repo}",
+                                        fields=REPO_FIELDS)
+        target.description = repo_data.get('description') if repo_data else None
+
+        if config.SCRAPE_BACKEND == 'graphql':
+            from src import graphql_scraper
+            threads = graphql_scraper.iter_threads(session, target, thread_limiter)
+        else:
+            threads = iter_rest_threads(session, target, thread_limiter)
+
+        completed = 0
+        last_print = time.time()
+
+        async for issue, result in threads:
+            target.writer.write(result)
+            if target.stream: target.stream.put(result)
+            completed += 1
+
+            if not result:
+                # a failed thread is only listed again if the watermark stays put
+                target.listing_complete = False
+            elif watermark_store:
+                watermark_store.mark(issue)
+                if completed % config.INCREMENTAL_SAVE_EVERY == 0: target.save_checkpoint("PROGRESS")
+
+            if time.time() - last_print > 10:
+                total = max(target.total_threads, completed)
+                print(f"{target.full_name} Progress: {completed}/{total} ({completed/total*100:.1f}%)")
+                last_print = time.time()
+
+        # merge unchanged threads from the previous dataset, replacing refetched ones
+        previous_file, refreshed = None, None
+        if watermark_store and watermark_store.final_file:
+            previous_file, refreshed = watermark_store.final_file, watermark_store.pending['threads']
+            print(f"[INCREMENTAL] Merging unchanged threads from {previous_file}")
+
+        print(f"\n[SAVE] Saving {target.full_name} FINAL...")
+        final_path = target.checkpoint_path("FINAL")
+        if target.writer.compact(final_path, previous_file, refreshed):
+            if watermark_store:
+                watermark_store.finish_run(final_path, complete=target.listing_complete)
+                if not target.listing_complete:
+                    print(f"[INCREMENTAL] Listing of {target.full_name} was incomplete or threads failed, so the watermark "
+                          f"was not advanced. The next run lists the same range again.")
+            target.writer.cleanup()
+            target.final_file = final_path
+            # typed copy for the process stage (the CSV stays as the raw archive / incremental base)
+            if config.STAGE_FORMAT == 'parquet':
+                target.final_file = storage.records_to_parquet(final_path)
+        else:
+            os.remove(final_path)
+            target.writer.cleanup()
+            print(f"No data processed for {target.full_name}.")
 
     except Exception as e:
-        print(f"CRITICAL: {e}")
+        print(f"CRITICAL ({target.full_name}): {e}")
         traceback.print_exc()
-        save_checkpoint("CRASH_DUMP")
+        target.save_checkpoint("CRASH_DUMP")
+    finally:
+        active_targets.remove(target)
+
+async def main(targets=None):
+    """
+    Scrapes every target concurrently over one aiohttp session, token scheduler and
+    profile store. Defaults to the single repo in config.OWNER/config.REPO.
+    """
+    global http_cache, profile_store, request_limiter
+    if targets is None:
+        targets = [RepoTarget(config.OWNER, config.REPO, config.OUTPUT_DIR)]
+
+    if config.HTTP_CACHE_ENABLED:
+        http_cache = ResponseCache()
+    profile_store = ProfileStore()
+
+    # no total timeout (pages can be slow), but a hung connect or read is retried
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=config.HTTP_CONNECT_TIMEOUT, sock_read=config.HTTP_READ_TIMEOUT)
+    connector = aiohttp.TCPConnector(
+        limit=config.HTTP_CONNECTION_LIMIT, limit_per_host=config.HTTP_CONNECTION_LIMIT_PER_HOST,
+        ttl_dns_cache=config.HTTP_DNS_CACHE_TTL, keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT)
+    try:
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            request_limiter = asyncio.Semaphore(config.MAX_CONCURRENT_REQUESTS)
+            thread_limiter = asyncio.Semaphore(config.MAX_CONCURRENT_THREADS)
+            await asyncio.gather(*(scrape_repo(session, target, thread_limiter) for target in targets))
+    finally:
+        if http_cache: http_cache.close()
+        profile_store.close()
+        request_latency.report()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import time
+from src import config
+
+# every run folder gets one, describing how each stage's files came to be
+MANIFEST_FILE = 'manifest.json'
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def code_hash(modules):
+    """Hash of the modules' source files, so a code change invalidates the stage's cached results."""
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def link_or_copy(src, dst):
+    if os.path.exists(dst): os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        # other filesystem, or no hard links there
+        shutil.copy2(src, dst)
+
+def snapshot(run_dir):
+    """(inode, mtime, size) per file in run_dir, to find what a stage wrote."""
+    files = {}
+    for name in os.listdir(run_dir):
+        path = os.path.join(run_dir, name)
+        if name != MANIFEST_FILE and os.path.isfile(path):
+            st = os.stat(path)
+            files[name] = (st.st_ino, st.st_mtime_ns, st.st_size)
+    return files
+
+def update_manifest(run_dir, stage, record):
+    path = os.path.join(run_dir, MANIFEST_FILE)
+    manifest = {'stages': {}}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    manifest['stages'][stage] = record
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+class StageCache:
+    """
+    Content-addressed store of stage outputs under STAGE_CACHE_DIR/<stage>/<key>/. The key hashes
+    the stage's input files, the config values it reads and its source code, so an unchanged re-run
+    links (or copies) the stored files into the run folder instead of recomputing them.
+    Stored files are shared by hard links, so stages must replace files rather than rewrite them.
+    """
+    def __init__(self, root=None, enabled=None):
+        self.root = root or config.STAGE_CACHE_DIR
+        self.enabled = config.STAGE_CACHE_ENABLED if enabled is None else enabled
+
+    def entry_dir(self, stage, key):
+        return os.path.join(self.root, stage, key)
+
+    def run(self, stage, run_dir, inputs, settings, modules, compute):
+        """
+        Runs `compute()` (which writes into run_dir and returns False on failure) unless the cache
+        has this stage's outputs for the same inputs/settings/code. Records the stage in the manifest.
+        Returns False only if compute failed.
+        """
+        start = time.perf_counter()
+        input_hashes = {path: file_hash(path) for path in inputs}
+        record = {
+            'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'inputs': input_hashes, 'config': settings, 'code': code_hash(modules)
+        }
+        key = hashlib.sha256(json.dumps([stage, sorted(input_hashes.values()), settings, record['code']],
+                                        sort_keys=True, default=str).encode()).hexdigest()[:32]
+        record['key'] = key
+
+        entry = self.entry_dir(stage, key)
+        if self.enabled and os.path.exists(os.path.join(entry, MANIFEST_FILE)):
+            with open(os.path.join(entry, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                outputs = json.load(f)['outputs']
+            for name in outputs:
+                link_or_copy(os.path.join(entry, name), os.path.join(run_dir, name))
+            record.update(cached=True, seconds=round(time.perf_counter() - start, 3), outputs=outputs)
+            update_manifest(run_dir, stage, record)
+            print(f"[CACHE] {stage}: reused {len(outputs)} files from {entry}")
+            return True
+
+        before = snapshot(run_dir)
+        if compute() is False: return False
+        after = snapshot(run_dir)
+        outputs = {name: {'bytes': after[name][2], 'sha256': file_hash(os.path.join(run_dir, name))}
+                   for name in sorted(after) if before.get(name) != after[name]}
+        record.update(cached=False, seconds=round(time.perf_counter() - start, 3), outputs=outputs)
+        update_manifest(run_dir, stage, record)
+        self.save(entry, run_dir, record)
+        return True
+
+    def save(self, entry, run_dir, record):
+        """Links a finished stage's outputs into the cache (an entry only appears once complete)."""
+        tmp = f"{entry}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in record['outputs']:
+            link_or_copy(os.path.join(run_dir, name), os.path.join(tmp, name))
+        with open(os.path.join(tmp, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(record, f, indent=2)
+        try:
+            os.replace(tmp, entry)
+        except OSError:
+            # stored meanwhile by another run with the same key
+            shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,82 @@
+import json
+import os
+from src import config
+
+class WatermarkStore:
+    """Persists per-thread `updated_at` watermarks so scrapes can run incrementally."""
+    def __init__(self, owner, repo):
+        os.makedirs(config.STATE_DIR, exist_ok=True)
+        self.path = os.path.join(config.STATE_DIR, f"{owner}-{repo}.json")
+        self.data = {
+            'since': None,          # `since=` value for the next issue listing
+            'final_file': None,     # last complete _FINAL dataset
+            'threads': {},          # thread number -> updated_at when last scraped
+            'pending': None         # in-progress run (for crash resume)
+        }
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data.update(json.load(f))
+            print(f"State Store: Loaded {len(self.data['threads'])} watermarks from {self.path}")
+
+        # watermarks are only valid while the rows they describe still exist
+        if self.data['final_file'] and not os.path.exists(self.data['final_file']):
+            print(f"[WARN] Previous dataset {self.data['final_file']} is missing. Doing a full scrape.")
+            self.data.update({'since': None, 'final_file': None, 'threads': {}})
+
+        pending = self.data['pending']
+        if pending and not os.path.isdir(pending['shard_dir']):
+            for number in pending['threads']:
+                self.data['threads'].pop(str(number), None)
+            pending['threads'] = []
+
+    @property
+    def since(self):
+        return self.data['since']
+
+    @property
+    def final_file(self):
+        return self.data['final_file']
+
+    @property
+    def pending(self):
+        return self.data['pending']
+
+    def is_current(self, issue):
+        """True if the thread hasn't changed since it was last scraped."""
+        return self.data['threads'].get(str(issue['number'])) == issue['updated_at']
+
+    def mark(self, issue):
+        self.data['threads'][str(issue['number'])] = issue['updated_at']
+        if self.data['pending'] is not None:
+            self.data['pending']['threads'].append(issue['number'])
+
+    def begin_run(self, started_at, shard_dir):
+        """Opens a pending run, or keeps the existing one if resuming after a crash."""
+        if self.data['pending'] is None:
+            self.data['pending'] = {'started_at': started_at, 'shard_dir': shard_dir, 'threads': []}
+        self.data['pending']['shard_dir'] = shard_dir
+        self.save()
+
+    def finish_run(self, final_file, complete=True):
+        """
+        Records the run's merged dataset. `since` only advances if the whole listing was read and
+        every thread expanded (`complete`); otherwise the run stays pending, so the next one lists
+        from the same point and picks up the threads on the failed pages and the failed threads.
+        """
+        self.data['final_file'] = os.path.abspath(final_file)
+        if complete:
+            # next listing starts from when the *first* attempt of this run began
+            self.data['since'] = self.data['pending']['started_at']
+            self.data['pending'] = None
+        else:
+            # the run's threads are in final_file now, not in its shards
+            self.data['pending']['threads'] = []
+        self.save()
+
+    def save(self):
+        # write to a temp file first so a crash mid-write can't corrupt the store
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,191 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src import config
+from src import records
+
+# Typed columnar hand-off between the scrape, process and clean stages.
+# CSV is only written for the final ClarityLoop files (and the raw _FINAL.csv archive).
+
+RECORD_SCHEMA = pa.schema([
+    ('record_id', pa.int64()), ('thread_id', pa.int64()), ('parent_id', pa.float64()),
+    ('repo', pa.string()), ('type', pa.string()), ('author_id', pa.int64()),
+    ('author_username', pa.string()), ('title', pa.string()), ('text_content', pa.string()),
+    ('created_at', pa.timestamp('us', tz='UTC')), ('url', pa.string()),
+    ('commits', pa.float64()), ('changed_files', pa.float64()), ('additions', pa.float64()), ('deletions', pa.float64()),
+    ('workspace_name', pa.string()), ('workspace_title', pa.string()), ('context_type', pa.string()),
+    ('author_full_name', pa.string()), ('author_email_fake', pa.string()), ('collaborators_fake', pa.string())
+])
+# low-cardinality columns, loaded as pandas categoricals
+CATEGORY_COLUMNS = ['repo', 'type', 'workspace_name', 'workspace_title', 'context_type']
+# rows per chunk when writing tables with text columns
+WRITE_CHUNK_ROWS = 100000
+# the bulky columns; stages that don't export bodies can skip them
+TEXT_COLUMNS = ['title', 'text_content']
+METADATA_COLUMNS = [c for c in RECORD_SCHEMA.names if c not in TEXT_COLUMNS]
+
+def parquet_path(path):
+    return os.path.splitext(path)[0] + '.parquet'
+
+def records_to_parquet(csv_path, out_path=None, chunk_rows=200000):
+    """
+    Converts a scraped _FINAL.csv to typed Parquet in chunks (constant memory).
+    Values are parsed exactly like pd.read_csv does, so downstream results don't change.
+    """
+    out_path = out_path or parquet_path(csv_path)
+    string_columns = [f.name for f in RECORD_SCHEMA if pa.types.is_string(f.type)]
+    dtypes = {**{c: 'str' for c in string_columns}, 'author_id': 'float64'}
+
+    writer = pq.ParquetWriter(out_path + '.tmp', RECORD_SCHEMA)
+    try:
+        for chunk in pd.read_csv(csv_path, dtype=dtypes, chunksize=chunk_rows):
+            chunk['created_at'] = pd.to_datetime(chunk['created_at'], utc=True, format='ISO8601')
+            writer.write_table(pa.Table.from_pandas(chunk[RECORD_SCHEMA.names], schema=RECORD_SCHEMA, preserve_index=False))
+    finally:
+        writer.close()
+    os.replace(out_path + '.tmp', out_path)
+    return out_path
+
+def read_records(path, columns=None):
+    """Loads scraped records from Parquet (typed) or CSV. `columns` limits what is read from disk."""
+    if path.endswith('.parquet'):
+        read_dictionary = [c for c in CATEGORY_COLUMNS if columns is None or c in columns]
+        return pq.read_table(path, columns=columns, read_dictionary=read_dictionary).to_pandas()
+    return pd.read_csv(path, usecols=columns)
+
+def records_frame(threads):
+    """Scraper ThreadRecords as a frame typed like read_records of the Parquet file (for streaming)."""
+    df = records.to_frame(threads)
+    df['created_at'] = pd.to_datetime(df['created_at'], utc=True, format='ISO8601').dt.as_unit('us')
+    return df
+
+def iter_records(path, columns, chunk_rows):
+    """
+    Streams string `columns` (e.g. TEXT_COLUMNS) of scraped records in chunks,
+    indexed by row position in the file like read_records' frame.
+    """
+    if path.endswith('.parquet'):
+        chunks = (b.to_pandas() for b in pq.ParquetFile(path).iter_batches(chunk_rows, columns=columns))
+    else:
+        # str dtype so a chunk of e.g. numeric-looking comments is read the same as the whole file
+        chunks = pd.read_csv(path, usecols=columns, dtype={c: 'str' for c in columns}, chunksize=chunk_rows)
+
+    offset = 0
+    for chunk in chunks:
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk[columns]
+
+def stage_path(name):
+    """Path of an intermediate table in the current run folder (e.g. 'users' -> users.parquet)."""
+    ext = '.parquet' if config.STAGE_FORMAT == 'parquet' else '.csv'
+    return os.path.join(config.OUTPUT_DIR, name + ext)
+
+def write_table(df, path):
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False, compression=config.STAGE_COMPRESSION)
+    else:
+        df.to_csv(path, index=False)
+
+def write_chunks(chunks, path, pool=None):
+    """
+    Writes an iterable of DataFrame chunks as one table, so only one chunk is materialized at a time.
+    With a `pool`, Parquet encoding/compression of each chunk runs there while the next one is built.
+    """
+    writer = None
+    pending = None
+    try:
+        for i, chunk in enumerate(chunks):
+            if not path.endswith('.parquet'):
+                chunk.to_csv(path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+                continue
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema, compression=config.STAGE_COMPRESSION or 'none')
+            table = table.cast(writer.schema)
+            if pool is None:
+                writer.write_table(table)
+                continue
+            if pending is not None: pending.result()
+            pending = pool.submit(writer.write_table, table)
+        if pending is not None: pending.result()
+    finally:
+        # never close the file under a running write
+        if pending is not None: pending.exception()
+        if writer is not None: writer.close()
+
+class TextSpill:
+    """
+    Text columns for the rows of one selected frame, collected during a streaming pass over the
+    records (add) and spilled to disk in buckets of `bucket_rows` rows of the frame's order.
+    lookup then reads back a slice of the frame with one bucket in memory at a time (per thread,
+    so the contexts and comments writers can share one spill).
+    """
+    def __init__(self, frame, spill_dir, columns, bucket_rows=WRITE_CHUNK_ROWS):
+        os.makedirs(spill_dir, exist_ok=True)
+        self.spill_dir = spill_dir
+        self.columns = columns
+        self.bucket_rows = bucket_rows
+        self.schema = pa.schema([('rank', pa.int64())] + [(c, pa.string()) for c in columns])
+
+        # file row -> position in the frame, and the same pairs sorted by file row for add
+        self.rank = pd.Series(np.arange(len(frame)), index=frame.index)
+        order = np.argsort(frame.index.to_numpy(), kind='stable')
+        self.rows = frame.index.to_numpy()[order]
+        self.ranks = order
+        self.writers = {}
+        self.local = threading.local()
+
+    def bucket_path(self, bucket):
+        return os.path.join(self.spill_dir, f"{bucket:06d}.parquet")
+
+    def add(self, chunk):
+        """Spills the text of this frame's rows in `chunk` (a frame from iter_records)."""
+        lo, hi = np.searchsorted(self.rows, [chunk.index[0], chunk.index[-1] + 1]) if len(chunk) else (0, 0)
+        if lo == hi: return
+        ranks = self.ranks[lo:hi]
+        part = chunk.loc[self.rows[lo:hi], self.columns].assign(rank=ranks)
+        buckets = ranks // self.bucket_rows
+        for bucket in np.unique(buckets):
+            if bucket not in self.writers:
+                self.writers[bucket] = pq.ParquetWriter(self.bucket_path(bucket), self.schema)
+            table = pa.Table.from_pandas(part[buckets == bucket], schema=self.schema, preserve_index=False)
+            self.writers[bucket].write_table(table)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+    def read_bucket(self, bucket):
+        cached = getattr(self.local, 'cached', (None, None))
+        if cached[0] != bucket:
+            self.local.cached = None
+            cached = (bucket, pq.read_table(self.bucket_path(bucket)).to_pandas().set_index('rank'))
+            self.local.cached = cached
+        return cached[1]
+
+    def lookup(self, part, column):
+        """`column` for `part`, a slice of the frame (rows in frame order)."""
+        ranks = self.rank.loc[part.index].to_numpy()
+        buckets = ranks // self.bucket_rows
+        values = np.empty(len(ranks), dtype=object)
+        for bucket in np.unique(buckets):
+            rows = buckets == bucket
+            values[rows] = self.read_bucket(bucket)[column].loc[ranks[rows]].to_numpy()
+        return pd.Series(values, index=part.index, dtype='str')
+
+def find_table(name):
+    """Finds an intermediate table in the current run folder, preferring Parquet. None if missing."""
+    for ext in ['.parquet', '.csv']:
+        path = os.path.join(config.OUTPUT_DIR, name + ext)
+        if os.path.exists(path): return path
+    return None
+
+def read_table(path, columns=None):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
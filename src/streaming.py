@@ -0,0 +1,139 @@
+import os
+import queue
+import re
+import threading
+import pandas as pd
+from src import config
+from src import processor
+from src import storage
+
+# dedup keys of the tables that list each entity once
+KEY_COLUMNS = {'workspaces': ['workspace_name', 'title'], 'users': ['email'],
+               'workspace_members': ['workspace_name', 'user_email']}
+
+class ThreadStream:
+    """
+    Standard-pipeline filtering of one repo while it is being scraped. The scraper puts every completed
+    thread's records on a queue; a worker thread keeps the filter's running counts (in-time comments per
+    thread, in-time cases per author) and appends each thread to partial ClarityLoop tables in
+    <run_dir>/partial/<table>/ as soon as it qualifies. Threads whose case author may still reach
+    FILTER_MIN_CASES_PER_USER are held in memory until then or the end of the scrape.
+
+    The final tables are still written by the batch processor from the _FINAL file, so they match a
+    separate --process run exactly; LTC selection needs the whole history, so it only runs there.
+    """
+    def __init__(self, full_name, run_dir):
+        self.full_name = full_name
+        self.partial_dir = os.path.join(run_dir, 'partial')
+        self.bots = re.compile('|'.join(config.FILTER_BOT_KEYWORDS), re.IGNORECASE)
+        self.cutoff = None
+        if config.FILTER_TIME_CUTOFF_MONTHS > 0:
+            self.cutoff = pd.Timestamp.now(tz='UTC') - pd.DateOffset(months=config.FILTER_TIME_CUTOFF_MONTHS)
+
+        self.seen = set()         # thread ids already received
+        self.case_counts = {}     # author_id -> in-time cases so far
+        self.held = {}            # author_id -> threads that qualify once the author does
+        self.qualified = set()
+        self.pending = []         # qualified threads not written yet
+        self.keys = {name: set() for name in KEY_COLUMNS}
+        self.stats = {'threads': 0, 'qualified': 0, 'parts': 0}
+        self.error = None
+
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self.run, name=f"stream-{full_name}", daemon=True)
+        self.worker.start()
+
+    def put(self, records):
+        """Called by the scraper with one thread's records (never blocks the event loop)."""
+        if records: self.queue.put(records)
+
+    def close(self):
+        """Waits for the queued threads and writes the last part."""
+        self.queue.put(None)
+        self.worker.join()
+        held = sum(len(threads) for threads in self.held.values())
+        print(f"[STREAM] {self.full_name}: {self.stats['qualified']}/{self.stats['threads']} threads qualified "
+              f"during the scrape ({held} still held), {self.stats['parts']} partial parts in {self.partial_dir}")
+        self.held = {}
+
+    def run(self):
+        while (records := self.queue.get()) is not None:
+            # after a failure the scrape goes on; the batch process stage still runs on its output
+            if self.error: continue
+            try:
+                self.add(records)
+                if len(self.pending) >= config.STREAM_FLUSH_THREADS: self.flush()
+            except Exception as e:
+                self.error = e
+                print(f"[ERROR] Streaming processor for {self.full_name} stopped: {e}")
+        if not self.error:
+            try:
+                self.flush()
+            except Exception as e:
+                self.error = e
+                print(f"[ERROR] Streaming processor for {self.full_name} stopped: {e}")
+
+    def keep(self, username, created_at):
+        """prepare_dataframe's bot filter and select_standard's time filter for one record."""
+        if username and self.bots.search(username): return False
+        return self.cutoff is None or pd.Timestamp(created_at) >= self.cutoff
+
+    def add(self, records):
+        thread_id = records.thread_id
+        if thread_id in self.seen: return
+        self.seen.add(thread_id)
+        self.stats['threads'] += 1
+
+        # record 0 is the thread's body (the case), the others its comments
+        kept = [self.keep(u, t) for u, t in zip(records.author_username, records.created_at)]
+        comments = sum(kept[1:])
+        authors = {records.author_id[0]} if kept[0] and records.author_id[0] is not None else set()
+        thread = (thread_id, records)
+
+        # a thread is complete when it arrives, so its comment count is final
+        if comments > 0 and comments >= config.FILTER_MIN_COMMENTS_PER_CASE:
+            self.qualify(thread)
+
+        for author in authors:
+            self.case_counts[author] = self.case_counts.get(author, 0) + 1
+            if self.case_counts[author] >= max(config.FILTER_MIN_CASES_PER_USER, 1):
+                # the author just became (or already is) active: so are all their threads
+                for held in self.held.pop(author, []):
+                    self.qualify(held)
+                self.qualify(thread)
+            elif thread_id not in self.qualified:
+                self.held.setdefault(author, []).append(thread)
+
+    def qualify(self, thread):
+        if thread[0] in self.qualified: return
+        self.qualified.add(thread[0])
+        self.pending.append(thread)
+        self.stats['qualified'] += 1
+
+    def flush(self):
+        """Writes the pending threads as one part of each table, with entities not written before."""
+        if not self.pending: return
+        raw = storage.records_frame([records for _, records in self.pending])
+        self.pending = []
+
+        df = processor.prepare_dataframe(raw)
+        if self.cutoff is not None: df = df[df['created_at'] >= self.cutoff]
+        df = df.sort_values(by=['thread_id', 'created_at'])
+        if df.empty: return
+
+        self.stats['parts'] += 1
+        ext = '.parquet' if config.STAGE_FORMAT == 'parquet' else '.csv'
+        for name, data, rows in processor.clarityloop_tables(df, raw):
+            if name in KEY_COLUMNS:
+                keys = list(zip(*(data[c] for c in KEY_COLUMNS[name])))
+                data = data[[key not in self.keys[name] for key in keys]]
+                self.keys[name].update(keys)
+                rows = len(data)
+            if rows == 0: continue
+
+            # hidden until complete, so the folder can be read (e.g. pd.read_parquet) at any time
+            directory = os.path.join(self.partial_dir, name)
+            os.makedirs(directory, exist_ok=True)
+            part = f"part-{self.stats['parts']:05d}{ext}"
+            processor.timed_write(data, os.path.join(directory, '.' + part))
+            os.replace(os.path.join(directory, '.' + part), os.path.join(directory, part))
@@ -0,0 +1,206 @@
+import argparse
+import datetime
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src import config
+from src import processor
+from src import storage
+
+# sweep parameter -> the config value it stands in for
+STANDARD_PARAMS = {
+    'cutoff_months': 'FILTER_TIME_CUTOFF_MONTHS',
+    'min_comments': 'FILTER_MIN_COMMENTS_PER_CASE',
+    'min_cases': 'FILTER_MIN_CASES_PER_USER'
+}
+LTC_PARAMS = {
+    'years': 'LTC_MIN_YEARS_ACTIVE',
+    'window_months': 'LTC_WINDOW_MONTHS',
+    'min_windows': 'LTC_MIN_ACTIVE_WINDOWS',
+    'min_cases_per_window': 'LTC_MIN_CASES_PER_WINDOW',
+    'min_comments_quality': 'LTC_MIN_COMMENTS_QUALITY'
+}
+
+class SweepData:
+    """
+    Records prepared once (bots removed, no text columns) plus integer-coded threads/users,
+    so each threshold combination is a handful of numpy passes instead of a full processor run.
+    """
+    def __init__(self, df, now=None):
+        self.df = df
+        self.now = now or pd.Timestamp.now(tz='UTC')
+        self.latest_date = df['created_at'].max()
+        self.created = pd.DatetimeIndex(df['created_at']).as_unit('ns').asi8
+
+        self.is_comment = (df['type'] == 'comment').to_numpy()
+        self.is_case = df['type'].isin(['issue_body', 'pull_request_body']).to_numpy()
+        self.is_context = df['parent_id'].isna().to_numpy()
+        self.case_starters = df[self.is_case]
+
+        self.thread, threads = pd.factorize(df['thread_id'])
+        self.n_threads = len(threads)
+        self.author, authors = pd.factorize(df['author_id'])  # standard counts cases per author_id
+        self.n_authors = len(authors)
+        self.username, self.usernames = pd.factorize(df['author_username'])  # LTC works on usernames
+        self.email, _ = pd.factorize(df['author_email_fake'])
+        self._time_masks = {}
+
+    def time_mask(self, cutoff_months):
+        if cutoff_months not in self._time_masks:
+            if cutoff_months > 0:
+                cutoff = self.now - pd.DateOffset(months=cutoff_months)
+                self._time_masks[cutoff_months] = self.created >= cutoff.as_unit('ns').value
+            else:
+                self._time_masks[cutoff_months] = np.ones(len(self.df), dtype=bool)
+        return self._time_masks[cutoff_months]
+
+    def counts_per(self, codes, rows, size):
+        """Rows per code among the selected rows (codes of missing values are -1 and dropped)."""
+        selected = codes[rows]
+        return np.bincount(selected[selected >= 0], minlength=size)
+
+    def sizes(self, rows):
+        """Row counts of the export_clarityloop_files tables for the selected rows."""
+        return {
+            'users': int(np.unique(self.email[rows]).size),
+            'contexts': int((rows & self.is_context).sum()),
+            'comments': int((rows & ~self.is_context).sum())
+        }
+
+def evaluate_standard(data, cutoff_months, min_comments, min_cases):
+    """Dataset sizes run_standard_pipeline would produce with these thresholds."""
+    in_time = data.time_mask(cutoff_months)
+
+    comment_counts = data.counts_per(data.thread, in_time & data.is_comment, data.n_threads)
+    selected = (comment_counts > 0) & (comment_counts >= min_comments)
+
+    case_counts = data.counts_per(data.author, in_time & data.is_case, data.n_authors)
+    active_user = (case_counts > 0) & (case_counts >= min_cases)
+    starters = in_time & data.is_case & (data.author >= 0)
+    starters[starters] = active_user[data.author[starters]]
+    selected[data.thread[starters]] = True
+
+    return data.sizes(in_time & selected[data.thread])
+
+def evaluate_ltc(data, years, window_months, min_windows, min_cases_per_window, min_comments_quality):
+    """Dataset sizes run_ltc_pipeline would produce with these thresholds."""
+    consistent = processor.find_consistent_users(data.case_starters, data.latest_date, years,
+                                                 window_months, min_windows, min_cases_per_window)
+    user_ok = data.usernames.isin(consistent)
+    cutoff = (data.latest_date - pd.DateOffset(years=years)).as_unit('ns').value
+    ltc_rows = (data.username >= 0) & (data.created > cutoff)
+    ltc_rows[ltc_rows] = user_ok[data.username[ltc_rows]]
+
+    comment_counts = data.counts_per(data.thread, ltc_rows & data.is_comment, data.n_threads)
+    selected = (comment_counts > 0) & (comment_counts >= min_comments_quality)
+    return data.sizes(ltc_rows & selected[data.thread])
+
+_worker_data = None
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+def _evaluate(job):
+    kind, params = job
+    evaluate = evaluate_standard if kind == 'standard' else evaluate_ltc
+    return evaluate(_worker_data, **params)
+
+def build_grid(args):
+    """Every (kind, params) combination requested on the command line."""
+    jobs = []
+    for kind, names in [('standard', STANDARD_PARAMS), ('ltc', LTC_PARAMS)]:
+        if args.mode not in [kind, 'all']: continue
+        prefix = '' if kind == 'standard' else 'ltc_'
+        values = [getattr(args, prefix + name) for name in names]
+        for combo in itertools.product(*values):
+            jobs.append((kind, dict(zip(names, combo))))
+    return jobs
+
+def run_sweep(data, jobs, workers=1):
+    _init_worker(data)
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(data,)) as pool:
+            results = list(pool.map(_evaluate, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        results = [_evaluate(job) for job in jobs]
+
+    # one table per mode, since they have different parameters
+    summaries = {}
+    for i, ((kind, params), sizes) in enumerate(zip(jobs, results)):
+        summaries.setdefault(kind, []).append({'id': i, **params, **sizes})
+    return {kind: pd.DataFrame(rows) for kind, rows in summaries.items()}
+
+def export_config(raw_df, run_dir, job_id, job, prepared=None, parent_urls=None):
+    """
+    Runs the real processor for one chosen combination into its own subfolder.
+    `prepared`/`parent_urls` (processor.prepare_dataframe/parent_url_index of raw_df) can be shared between exports.
+    """
+    kind, params = job
+    names = STANDARD_PARAMS if kind == 'standard' else LTC_PARAMS
+    saved = {name: getattr(config, name) for name in names.values()}
+    saved['OUTPUT_DIR'] = config.OUTPUT_DIR
+    try:
+        for param, value in params.items():
+            setattr(config, names[param], value)
+        config.OUTPUT_DIR = os.path.join(run_dir, f"{job_id:03d}_{kind}")
+        os.makedirs(config.OUTPUT_DIR, exist_ok=True)
+        if kind == 'standard':
+            processor.run_standard_pipeline(raw_df, prepared, parent_urls)
+        else:
+            processor.run_ltc_pipeline(raw_df, prepared, parent_urls)
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+def dataset_name(input_file):
+    """Run folder prefix for a sweep of `input_file`, e.g. github_owner_repo for github_owner_repo_FINAL.parquet."""
+    name = os.path.splitext(os.path.basename(input_file))[0]
+    return name[:-len('_FINAL')] if name.endswith('_FINAL') else name
+
+def int_list(value):
+    return [int(v) for v in value.split(',')]
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep processor thresholds over one prepared dataset")
+    parser.add_argument('--input-file', type=str, required=True, help="Path to a _FINAL.parquet/_FINAL.csv")
+    parser.add_argument('--mode', choices=['standard', 'ltc', 'all'], default='all')
+    parser.add_argument('--workers', type=int, default=1, help="Evaluate combinations in a process pool")
+    parser.add_argument('--export', type=int, nargs='*', default=[], help="Summary row ids to fully export")
+
+    # comma-separated values per threshold (default: the config value)
+    for prefix, names in [('', STANDARD_PARAMS), ('ltc_', LTC_PARAMS)]:
+        for name, config_name in names.items():
+            default = getattr(config, config_name)
+            parser.add_argument(f"--{(prefix + name).replace('_', '-')}", type=int_list,
+                                default=[default], help=f"Values for {config_name} (default {default})")
+    args = parser.parse_args()
+
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    run_dir = os.path.join(config.BASE_DATA_DIR, f"{dataset_name(args.input_file)}_SWEEP_{timestamp}")
+    os.makedirs(run_dir, exist_ok=True)
+
+    # no combination needs the comment bodies, so they are never loaded for the sweep itself
+    print(f"[SWEEP] Loading {args.input_file}")
+    data = SweepData(processor.prepare_dataframe(storage.read_records(args.input_file, storage.METADATA_COLUMNS)))
+
+    jobs = build_grid(args)
+    print(f"[SWEEP] Evaluating {len(jobs)} combinations...")
+    for kind, summary in run_sweep(data, jobs, args.workers).items():
+        summary.to_csv(os.path.join(run_dir, f'sweep_{kind}.csv'), index=False)
+        print(f"\n--- {kind.upper()} ---")
+        print(summary.to_string(index=False))
+    print(f"\n[SWEEP] Summaries saved to {run_dir}")
+
+    if args.export:
+        raw_df = storage.read_records(args.input_file)
+        prepared = processor.prepare_dataframe(raw_df)
+        parent_urls = processor.parent_url_index(raw_df)
+        for job_id in args.export:
+            print(f"\n[SWEEP] Exporting combination {job_id}: {jobs[job_id]}")
+            export_config(raw_df, run_dir, job_id, jobs[job_id], prepared, parent_urls)
+
+if __name__ == "__main__":
+    main()
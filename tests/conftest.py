@@ -0,0 +1,6 @@
+import os
+import sys
+
+# src.scraper creates its token manager on import
+os.environ.setdefault('GITHUB_TOKEN', 'test-token')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
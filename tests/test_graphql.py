@@ -0,0 +1,51 @@
+import asyncio
+from src import config
+from src import graphql_scraper
+from src import scraper
+
+class Profiles:
+    def remember(self, login, name):
+        pass
+
+def comment(number):
+    return {'databaseId': number, 'body': f'comment {number}', 'createdAt': f'2024-01-0{number}T00:00:00Z',
+            'url': f'http://x/{number}', 'author': {'__typename': 'User', 'login': 'bob', 'databaseId': 2, 'name': 'Bob'}}
+
+def node(number, comments, has_next):
+    return {
+        'id': f'I_{number}', 'databaseId': number, 'number': number, 'title': 'title', 'body': 'body',
+        'createdAt': '2024-01-01T00:00:00Z', 'updatedAt': '2024-01-09T00:00:00Z', 'url': f'http://x/issues/{number}',
+        'author': {'__typename': 'User', 'login': 'alice', 'databaseId': 1, 'name': 'Alice'},
+        'comments': {'pageInfo': {'hasNextPage': has_next, 'endCursor': 'c1'}, 'nodes': comments}
+    }
+
+def page(nodes):
+    return {'totalCount': len(nodes), 'pageInfo': {'hasNextPage': False, 'endCursor': None}, 'nodes': nodes}
+
+def test_partial_errors_mark_listing_incomplete(monkeypatch):
+    error = [{'message': 'Something went wrong', 'path': ['repository', 'threads', 'nodes', 0]}]
+    responses = {
+        # a listing page whose first thread failed, and a comment page whose second comment did
+        'issues': {'data': {'repository': {'threads': page([None, node(7, [comment(1), None], True)])}}, 'errors': error},
+        'pullRequests': {'data': {'repository': {'threads': page([])}}},
+        'node': {'data': {'node': {'comments': {'pageInfo': {'hasNextPage': False, 'endCursor': None},
+                                                'nodes': [comment(2), None]}}}, 'errors': error},
+    }
+
+    async def fetch_json(session, url, retries=3, payload=None, fields=None):
+        query = payload['query']
+        key = next(k for k in ['issues(', 'pullRequests(', 'node('] if k in query)[:-1]
+        return responses[key], None
+    monkeypatch.setattr(scraper, 'fetch_json', fetch_json)
+    monkeypatch.setattr(scraper, 'profile_store', Profiles())
+    monkeypatch.setattr(config, 'MAX_ISSUE_PAGES', 0)
+
+    async def run():
+        return [item async for item in graphql_scraper.iter_threads(None, target, asyncio.Semaphore(4))]
+
+    target = scraper.RepoTarget('o', 'r')
+    threads = asyncio.run(run())
+
+    assert [issue['number'] for issue, _ in threads] == [7]
+    assert threads[0][1].record_id == [7, 1, 2]
+    assert not target.listing_complete
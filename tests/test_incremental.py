@@ -0,0 +1,144 @@
+import asyncio
+from src import config
+from src import scraper
+from src.state import WatermarkStore
+
+def fake_listing(pages, failing):
+    """fetch_json stand-in serving `pages` pages of one issue each; pages in `failing` fail like after the retries."""
+    async def fetch_json(session, url, retries=3, payload=None, fields=None):
+        number = scraper.URL(url).query.get('page')
+        number = int(number) if number else 1
+        if number in failing: return None, None
+        links = {'last': {'url': scraper.page_url(url, pages)}}
+        return [{'number': number, 'updated_at': '2024-01-01T00:00:00Z'}], links
+    return fetch_json
+
+def test_iter_pages_reports_failed_pages(monkeypatch):
+    monkeypatch.setattr(scraper, 'fetch_json', fake_listing(4, {3}))
+    failed = []
+
+    async def run():
+        return [number async for number, _ in scraper.iter_pages_async(None, 'http://x/issues?per_page=100', failed=failed)]
+
+    assert sorted(asyncio.run(run())) == [1, 2, 4]
+    assert failed == [3]
+
+def test_iter_pages_reports_failed_first_page(monkeypatch):
+    monkeypatch.setattr(scraper, 'fetch_json', fake_listing(4, {1}))
+    failed = []
+
+    async def run():
+        return [number async for number, _ in scraper.iter_pages_async(None, 'http://x/issues?per_page=100', failed=failed)]
+
+    assert asyncio.run(run()) == []
+    assert failed == [1]
+
+def test_incomplete_listing_keeps_watermark(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'STATE_DIR', str(tmp_path / 'state'))
+    final_file = tmp_path / 'run1_FINAL.csv'
+    final_file.write_text('')
+
+    store = WatermarkStore('o', 'r')
+    store.begin_run('2024-01-01T00:00:00Z', str(tmp_path / 'shards1'))
+    store.mark({'number': 1, 'updated_at': '2023-12-31T00:00:00Z'})
+    store.finish_run(str(final_file), complete=False)
+
+    # the recovery run lists from the same point, but doesn't refetch what was already merged
+    store = WatermarkStore('o', 'r')
+    assert store.since is None
+    assert store.final_file == str(final_file)
+    assert store.is_current({'number': 1, 'updated_at': '2023-12-31T00:00:00Z'})
+    assert store.pending['threads'] == []
+
+    store.begin_run('2024-01-02T00:00:00Z', str(tmp_path / 'shards2'))
+    store.finish_run(str(final_file))
+    # the watermark is the start of the first, incomplete attempt
+    assert store.since == '2024-01-01T00:00:00Z'
+    assert store.pending is None
+
+def test_failed_thread_keeps_watermark(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'INCREMENTAL', True)
+    monkeypatch.setattr(config, 'STATE_DIR', str(tmp_path / 'state'))
+    monkeypatch.setattr(config, 'STAGE_FORMAT', 'csv')
+
+    async def fetch_json(session, url, retries=3, payload=None, fields=None):
+        return None, None
+    monkeypatch.setattr(scraper, 'fetch_json', fetch_json)
+
+    done = {'number': 1, 'updated_at': '2024-01-01T00:00:00Z'}
+    failed = {'number': 2, 'updated_at': '2024-01-01T00:00:00Z'}
+
+    async def iter_rest_threads(session, target, thread_limiter):
+        records = scraper.ThreadRecords(1, 'o/r', 'r', 'r', 'example.com', 'issue', 'bug', 'title', {
+            'commits': None, 'changed_files': None, 'additions': None, 'deletions': None})
+        records.add(1, 10, 'alice', 'body', '2023-12-31T00:00:00Z', 'http://x/1', 'Alice')
+        yield done, records
+        # e.g. process_thread caught an exception
+        yield failed, []
+    monkeypatch.setattr(scraper, 'iter_rest_threads', iter_rest_threads)
+
+    target = scraper.RepoTarget('o', 'r', str(tmp_path / 'out'))
+    asyncio.run(scraper.scrape_repo(None, target, None))
+
+    assert not target.listing_complete
+    store = WatermarkStore('o', 'r')
+    assert store.since is None
+    assert store.is_current(done)
+    assert not store.is_current(failed)
+
+def test_iter_pages_cancels_pending_pages_on_close(monkeypatch):
+    started, finished = [], []
+
+    async def fetch_json(session, url, retries=3, payload=None, fields=None):
+        number = int(scraper.URL(url).query.get('page') or 1)
+        started.append(number)
+        if number > 1: await asyncio.sleep(10)
+        finished.append(number)
+        return [{'number': number}], {'last': {'url': scraper.page_url(url, 5)}}
+    monkeypatch.setattr(scraper, 'fetch_json', fetch_json)
+
+    async def run():
+        async def consume():
+            return [number async for number, _ in scraper.iter_pages_async(None, 'http://x/issues/comments?per_page=100')]
+        # e.g. a harvest cancelled while its later pages are in flight
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        await asyncio.sleep(0)
+        return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+    assert asyncio.run(run()) == []
+    assert sorted(started) == [1, 2, 3, 4, 5]
+    assert finished == [1]
+
+def fake_harvest(monkeypatch, failing):
+    """Thread 7 is listed with one comment; the old one sits on slow page 2, one posted after the listing on page 3."""
+    comments = {
+        1: [{'id': 1, 'issue_url': 'http://x/issues/5', 'created_at': '2024-01-01T00:00:00Z'}],
+        2: [{'id': 2, 'issue_url': 'http://x/issues/7', 'created_at': '2024-01-02T00:00:00Z'}],
+        3: [{'id': 3, 'issue_url': 'http://x/issues/7', 'created_at': '2024-01-05T00:00:00Z'}],
+    }
+
+    async def fetch_json(session, url, retries=3, payload=None, fields=None):
+        number = int(scraper.URL(url).query.get('page') or 1)
+        if number == 2: await asyncio.sleep(0.05)
+        if number in failing: return None, None
+        return comments[number], {'last': {'url': scraper.page_url(url, 3)}}
+    monkeypatch.setattr(scraper, 'fetch_json', fetch_json)
+
+    async def run():
+        target = scraper.RepoTarget('o', 'r')
+        harvest = scraper.CommentHarvest(None, target)
+        claimed = await harvest.claim({'number': 7, 'comments': 1, 'updated_at': '2024-01-02T00:00:00Z'})
+        await harvest.task
+        return claimed
+    return asyncio.run(run())
+
+def test_harvest_waits_for_older_comments(monkeypatch):
+    # the newer comment alone matches the listed count, but the claim waits for page 2
+    claimed = fake_harvest(monkeypatch, set())
+    assert [c['id'] for c in claimed] == [3, 2]
+
+def test_harvest_falls_back_when_older_comments_are_lost(monkeypatch):
+    assert fake_harvest(monkeypatch, {2}) is None
@@ -0,0 +1,140 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from src import config
+from src import processor
+from src import storage
+
+def scraped_records(seed=0, threads=60):
+    """A small _FINAL-shaped frame: a few prolific users, bots, and one thread whose body wasn't scraped."""
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp('2024-06-01', tz='UTC')
+    users = [f"user{i}" for i in range(8)] + ['dependabot[bot]']
+    rows = []
+    for number in range(1, threads + 1):
+        author = users[rng.integers(len(users))]
+        created = now - pd.Timedelta(days=int(rng.integers(1, 4 * 365)))
+        if number != threads:
+            rows.append({'record_id': number, 'thread_id': number, 'parent_id': None, 'type': 'issue_body',
+                         'author_username': author, 'title': f'title {number}', 'text_content': f'body {number}',
+                         'created_at': created, 'url': f'http://x/issues/{number}', 'context_type': 'bug'})
+        for i in range(int(rng.integers(0, 5)) if number != threads else 2):
+            commenter = users[rng.integers(len(users))]
+            rows.append({'record_id': 1000 + number * 10 + i, 'thread_id': number, 'parent_id': float(number),
+                         'type': 'comment', 'author_username': commenter, 'title': None, 'text_content': f'comment {i}',
+                         'created_at': created + pd.Timedelta(hours=i + 1), 'url': f'http://x/issues/{number}#{i}',
+                         'context_type': None})
+    df = pd.DataFrame(rows)
+    df['created_at'] = df['created_at'].dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+    df['author_id'] = df['author_username'].map({u: i for i, u in enumerate(users)})
+    df['repo'] = 'o/r'
+    df['workspace_name'] = 'r'
+    df['workspace_title'] = 'R'
+    df['author_full_name'] = df['author_username'].str.title()
+    df['author_email_fake'] = df['author_username'] + '@example.com'
+    df['collaborators_fake'] = ''
+    for column in ['commits', 'changed_files', 'additions', 'deletions']:
+        df[column] = None
+    return df[storage.RECORD_SCHEMA.names]
+
+def tables(output_dir):
+    return {name: storage.read_table(os.path.join(output_dir, name)) for name in sorted(os.listdir(output_dir))}
+
+@pytest.mark.parametrize('stage_format', ['parquet', 'csv'])
+def test_chunked_matches_in_memory(tmp_path, monkeypatch, stage_format):
+    monkeypatch.setattr(config, 'STAGE_FORMAT', stage_format)
+    monkeypatch.setattr(config, 'LTC_MIN_COMMENTS_QUALITY', 1)
+    monkeypatch.setattr(config, 'FILTER_TIME_CUTOFF_MONTHS', 0)
+    monkeypatch.setattr(config, 'PROCESS_CHUNK_ROWS', 7)
+    path = str(tmp_path / 'github_o_r_FINAL.csv')
+    scraped_records().to_csv(path, index=False)
+
+    monkeypatch.setattr(config, 'OUTPUT_DIR', str(tmp_path / 'memory'))
+    os.makedirs(config.OUTPUT_DIR)
+    processor.run_pipelines(storage.read_records(path))
+    monkeypatch.setattr(config, 'OUTPUT_DIR', str(tmp_path / 'chunked'))
+    os.makedirs(config.OUTPUT_DIR)
+    processor.run_chunked_pipelines(path)
+
+    memory, chunked = tables(str(tmp_path / 'memory')), tables(str(tmp_path / 'chunked'))
+    assert list(memory) == list(chunked)
+    assert any(name.startswith('ltc_') for name in memory)
+    for name in memory:
+        pd.testing.assert_frame_equal(memory[name], chunked[name], check_dtype=False)
+
+    # the thread without a scraped body: its comments have no context link
+    comments = memory[f'context_comments.{stage_format}']
+    orphans = comments['comment_link'].str.startswith('http://x/issues/60#')
+    assert orphans.sum() == 2
+    assert comments.loc[orphans, 'context_link'].isna().all()
+
+def consistent_users_loop(case_starters, latest_date, years, window_months, min_windows, min_cases):
+    """find_consistent_users as a per-user, per-window loop (the pre-vectorized version, generalized)."""
+    n_windows = years * 12 // window_months
+    users = []
+    for username, group in case_starters.groupby('author_username'):
+        active = 0
+        for k in range(n_windows):
+            w_end = latest_date - pd.DateOffset(months=k * window_months)
+            w_start = latest_date - pd.DateOffset(months=(k + 1) * window_months)
+            cases = ((group['created_at'] > w_start) & (group['created_at'] <= w_end)).sum()
+            active += cases >= min_cases
+        if active >= min_windows:
+            users.append(username)
+    return users
+
+@pytest.mark.parametrize('window_months, min_windows, min_cases', [(12, 3, 1), (3, 8, 1), (6, 4, 2)])
+def test_find_consistent_users_matches_loop(window_months, min_windows, min_cases):
+    df = processor.prepare_dataframe(scraped_records(threads=400))
+    case_starters = df[df['type'] == 'issue_body']
+    latest_date = df['created_at'].max()
+    # cases right on the window edges (a window is (start, end])
+    edges = pd.DataFrame({'author_username': ['edge1', 'edge2', 'edge2'],
+                          'created_at': [latest_date - pd.DateOffset(years=1), latest_date,
+                                         latest_date - pd.DateOffset(months=window_months)]})
+    case_starters = pd.concat([case_starters, edges], ignore_index=True)
+
+    expected = consistent_users_loop(case_starters, latest_date, 3, window_months, min_windows, min_cases)
+    result = processor.find_consistent_users(case_starters, latest_date, 3, window_months, min_windows, min_cases)
+    assert expected, "the fixture should have consistent users"
+    assert sorted(result) == sorted(expected)
+
+def tables_straightforward(df, raw_df):
+    """The 5 tables as drop_duplicates/rename/map over the full frame (the pre-chunked version)."""
+    domain = config.TARGET_EMAIL_DOMAIN
+    df = df.join(raw_df[storage.TEXT_COLUMNS])
+    ws = df[['workspace_name', 'workspace_title']].drop_duplicates().rename(columns={'workspace_title': 'title'})
+    ws['owner_email'] = f"owner@{domain}"
+    us = df[['author_full_name', 'author_email_fake']].drop_duplicates('author_email_fake')
+    us = us.rename(columns={'author_full_name': 'name', 'author_email_fake': 'email'}).assign(gender='UNKNOWN', ethnicity='UNKNOWN')
+    mem = df[['workspace_name', 'author_email_fake']].drop_duplicates().rename(columns={'author_email_fake': 'user_email'})
+    mem = mem.assign(role='MEMBER', title='Contributor', manager_email=f"manager@{domain}")
+
+    ctx = df[df['parent_id'].isna()].rename(columns={
+        'author_email_fake': 'author_email', 'url': 'link', 'text_content': 'body',
+        'author_username': 'user', 'collaborators_fake': 'collaborators'})
+    ctx['description'] = ctx['body'].str.slice(0, 200) + '...'
+    for col in ['author', 'content', 'key', 'reporter']: ctx[col] = None
+    ctx = ctx[['workspace_name', 'author_email', 'link', 'context_type', 'title', 'created_at', 'user',
+               'description', 'body', 'author', 'content', 'key', 'reporter', 'collaborators']]
+
+    com = df[df['parent_id'].notna()].copy()
+    com['context_link'] = com['parent_id'].map(raw_df.drop_duplicates('record_id').set_index('record_id')['url'])
+    com = com.rename(columns={'author_email_fake': 'comment_author_email', 'text_content': 'comment_content',
+                              'url': 'comment_link'})
+    com = com[['context_link', 'comment_author_email', 'comment_content', 'comment_link']]
+    return {'workspaces': ws, 'users': us, 'workspace_members': mem, 'contexts': ctx, 'context_comments': com}
+
+def test_clarityloop_tables_match_straightforward():
+    raw_df = scraped_records()
+    # a second workspace, so the dedup keys have more than one value each
+    raw_df.loc[raw_df['thread_id'] % 3 == 0, ['workspace_name', 'workspace_title']] = ['r2', 'R2']
+    df = processor.prepare_dataframe(raw_df)
+
+    expected = tables_straightforward(df, raw_df)
+    for name, data, rows in processor.clarityloop_tables(df, raw_df, chunk_rows=5):
+        table = data if isinstance(data, pd.DataFrame) else pd.concat(list(data))
+        assert rows == len(table)
+        pd.testing.assert_frame_equal(table.reset_index(drop=True), expected[name].reset_index(drop=True),
+                                      check_dtype=False)
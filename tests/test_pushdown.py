@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src import processor
+from src.pushdown import ListingFilter
+
+def synthetic_repo(seed=0, threads=400):
+    """(listing entries, raw records) of a repo whose newest activity is a lone comment on an old thread."""
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp.now(tz='UTC').floor('s')
+    users = [f"user{i}" for i in range(40)] + ['dependabot[bot]']
+    iso = lambda t: t.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    listing, rows = [], []
+    for number in range(1, threads + 1):
+        author = users[rng.integers(len(users))]
+        created = now - pd.Timedelta(days=int(rng.integers(120, 4 * 365)))
+        comment_times = sorted(created + pd.Timedelta(hours=int(h)) for h in rng.integers(1, 2000, rng.integers(0, 5)))
+        if number == 1:
+            # the newest record overall (it sets LTC's latest_date), on a thread below every comment threshold
+            comment_times = [now - pd.Timedelta(days=1)]
+        rows.append({'record_id': number, 'thread_id': number, 'type': 'issue_body', 'author_username': author,
+                     'author_id': users.index(author), 'created_at': iso(created)})
+        for i, t in enumerate(comment_times):
+            commenter = users[rng.integers(len(users))]
+            rows.append({'record_id': 100000 + number * 10 + i, 'thread_id': number, 'type': 'comment',
+                         'author_username': commenter, 'author_id': users.index(commenter), 'created_at': iso(t)})
+        listing.append({'id': number, 'number': number, 'user': {'login': author, 'id': users.index(author)},
+                        'created_at': iso(created), 'updated_at': iso(max([created] + comment_times)),
+                        'comments': len(comment_times)})
+    raw = pd.DataFrame(rows).assign(title=None, text_content=None)
+    return listing, raw
+
+def pushed_down(listing, raw, mode):
+    """raw as a scrape with pushdown would have it: skipped threads keep only their body record."""
+    listing_filter = ListingFilter(mode)
+    skipped = {issue['number'] for issue in listing if listing_filter.classify(issue) == 'skip'}
+    skipped |= {issue['number'] for issue in listing_filter.release()[1]}
+    assert skipped, "the fixture should let the filter skip something"
+    return raw[~(raw['thread_id'].isin(skipped) & (raw['type'] == 'comment'))]
+
+@pytest.mark.parametrize('mode', ['ltc', 'all'])
+def test_pushdown_keeps_ltc_output(mode):
+    listing, raw = synthetic_repo()
+    full = processor.prepare_dataframe(raw)
+    pushed = processor.prepare_dataframe(pushed_down(listing, raw, mode))
+
+    assert pushed['created_at'].max() == full['created_at'].max()
+    assert set(processor.select_ltc(pushed)['record_id']) == set(processor.select_ltc(full)['record_id'])
+    if mode == 'all':
+        assert set(processor.select_standard(pushed)['record_id']) == set(processor.select_standard(full)['record_id'])
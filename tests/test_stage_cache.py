@@ -0,0 +1,56 @@
+import json
+import os
+from src import stage_cache
+from src.stage_cache import MANIFEST_FILE, StageCache
+
+def run_stage(cache, tmp_path, run, settings, calls, result=None):
+    """One 'process' run on input.txt into its own run folder; the stage upper-cases its input."""
+    run_dir = tmp_path / run
+    run_dir.mkdir()
+    source = tmp_path / 'input.txt'
+
+    def compute():
+        calls.append(run)
+        (run_dir / 'out.txt').write_text(source.read_text().upper())
+        return result
+
+    ok = cache.run('process', str(run_dir), [str(source)], settings, [stage_cache], compute)
+    return ok, run_dir
+
+def manifest(run_dir):
+    with open(os.path.join(run_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)['stages']['process']
+
+def test_stage_cache_hit_and_miss(tmp_path):
+    cache = StageCache(str(tmp_path / 'cache'), enabled=True)
+    (tmp_path / 'input.txt').write_text('abc')
+    calls = []
+
+    assert run_stage(cache, tmp_path, 'run1', {'mode': 'all'}, calls) == (True, tmp_path / 'run1')
+    # same input, settings and code: the stored output is reused
+    ok, run_dir = run_stage(cache, tmp_path, 'run2', {'mode': 'all'}, calls)
+    assert ok and calls == ['run1']
+    assert (run_dir / 'out.txt').read_text() == 'ABC'
+    assert manifest(run_dir)['cached'] and manifest(run_dir)['key'] == manifest(tmp_path / 'run1')['key']
+    assert list(manifest(run_dir)['outputs']) == ['out.txt']
+
+    # a changed setting or input is a miss
+    run_stage(cache, tmp_path, 'run3', {'mode': 'ltc'}, calls)
+    (tmp_path / 'input.txt').write_text('abd')
+    _, run_dir = run_stage(cache, tmp_path, 'run4', {'mode': 'all'}, calls)
+    assert calls == ['run1', 'run3', 'run4']
+    assert (run_dir / 'out.txt').read_text() == 'ABD'
+    assert not manifest(run_dir)['cached']
+
+def test_stage_cache_skips_failed_and_disabled_runs(tmp_path):
+    (tmp_path / 'input.txt').write_text('abc')
+    calls = []
+
+    cache = StageCache(str(tmp_path / 'cache'), enabled=True)
+    assert run_stage(cache, tmp_path, 'failed', {}, calls, result=False) == (False, tmp_path / 'failed')
+    assert not os.path.exists(tmp_path / 'cache' / 'process')
+
+    disabled = StageCache(str(tmp_path / 'cache'), enabled=False)
+    run_stage(disabled, tmp_path, 'run1', {}, calls)
+    run_stage(disabled, tmp_path, 'run2', {}, calls)
+    assert calls == ['failed', 'run1', 'run2']
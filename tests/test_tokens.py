@@ -0,0 +1,33 @@
+import asyncio
+import time
+from src import config
+from src import scraper
+
+def test_pacing_gaps_are_not_stalls(monkeypatch):
+    monkeypatch.setattr(config, 'TOKEN_BURST', 1)
+    monkeypatch.setattr(config, 'TOKEN_REQUESTS_PER_MINUTE', 600)
+    manager = scraper.SmartTokenManager()
+
+    async def run():
+        for _ in range(3):
+            index, _ = await manager.acquire()
+            manager.release(index)
+    asyncio.run(run())
+
+    assert manager.stalls['count'] == 0
+    assert manager.pacing['count'] == 2
+    assert manager.pacing['seconds'] > 0.1
+
+def test_retry_after_is_a_stall(monkeypatch):
+    monkeypatch.setattr(config, 'TOKEN_REQUESTS_PER_MINUTE', 600000)
+    manager = scraper.SmartTokenManager()
+    # e.g. a secondary rate limit's Retry-After
+    manager.token_data[0]['blocked_until'] = time.time() + 0.2
+
+    async def run():
+        index, _ = await manager.acquire()
+        manager.release(index)
+    asyncio.run(run())
+
+    assert manager.stalls['count'] == 1
+    assert manager.pacing['count'] == 0
@@ -0,0 +1,46 @@
+import pandas as pd
+from src.records import COLUMNS, ThreadRecords
+from src.writer import ShardedWriter
+
+PR_STATS = {'commits': None, 'changed_files': None, 'additions': None, 'deletions': None}
+
+def thread(number, comments, text):
+    """A thread whose records share a few timestamps with other threads (ties are broken by record_id)."""
+    records = ThreadRecords(number, 'o/r', 'r', 'R', 'example.com', 'issue_body', 'bug', f'title {number}', PR_STATS)
+    for i in range(comments + 1):
+        day = (number * 3 + i) % 5 + 1
+        records.add(number * 100 + i, i, f'user{i}', f'{text} {number}.{i}', f'2024-01-0{day}T00:00:00Z',
+                    f'http://x/{number}#{i}', f'User {i}')
+    return records
+
+def straightforward(*frames):
+    """The in-memory version: concatenate, keep each record's newest copy, sort."""
+    df = pd.concat(frames).drop_duplicates(subset=['record_id'], keep='last')
+    order = lambda column: column.astype(int) if column.name == 'record_id' else column
+    return df.sort_values(['created_at', 'record_id'], ascending=[False, True], key=order).reset_index(drop=True)
+
+def read(path):
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+def test_compact_matches_straightforward_merge(tmp_path):
+    first = ShardedWriter(str(tmp_path / 'run1'), shard_rows=4)
+    for number in range(1, 9):
+        first.write(thread(number, number % 4, 'old'))
+    previous = str(tmp_path / 'run1_FINAL.csv')
+    assert first.compact(previous) == sum(number % 4 + 1 for number in range(1, 9))
+    assert read(previous).equals(straightforward(*(read(path) for path in first.shard_paths())))
+
+    # the next run refetches threads 2 and 5, and a crash left thread 7 in two shards
+    second = ShardedWriter(str(tmp_path / 'run2'), shard_rows=4)
+    for number, text in [(2, 'new'), (7, 'retry'), (5, 'new'), (7, 'new'), (9, 'new')]:
+        second.write(thread(number, 3, text))
+    final = str(tmp_path / 'run2_FINAL.csv')
+    second.compact(final, previous, skip_threads=[2, 5])
+
+    kept = read(previous)
+    kept = kept[~kept['thread_id'].isin(['2', '5'])]
+    expected = straightforward(kept, *(read(path) for path in second.shard_paths()))
+    result = read(final)
+    assert list(result.columns) == COLUMNS
+    assert result.equals(expected)
+    assert set(result.loc[result['thread_id'].isin(['2', '5', '7', '9']), 'text_content'].str.split().str[0]) == {'new'}